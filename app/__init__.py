@@ -1,24 +1,49 @@
 import logging
 import os
+import weakref
 from logging.handlers import RotatingFileHandler
 
-from authlib.integrations.flask_client import OAuth
 from flask import Flask
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy import event
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from app.oauth import CachedMetadataOAuth
+from app.ratelimit import rate_limit_key
+
 db = SQLAlchemy()
 login_manager = LoginManager()
 csrf = CSRFProtect()
-limiter = Limiter(key_func=get_remote_address, default_limits=["200 per minute"])
-oauth = OAuth()
+limiter = Limiter(key_func=rate_limit_key, default_limits=["200 per minute"])
+oauth = CachedMetadataOAuth()
 
 _WEAK_KEYS = {"dev-secret-change-me", "change-me", "secret"}
 
+# Under gunicorn --preload the app is built once and then forked; give each
+# worker a fresh pool instead of the parent's open connections. One hook for
+# the process; engines of apps that have been dropped fall out of the set.
+_engines = weakref.WeakSet()
+
+
+def _dispose_engines_after_fork():
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+
+def _install_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
 
 def create_app():
     app = Flask(__name__)
@@ -36,6 +61,16 @@ def create_app():
 
     # Extensions
     db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+        if app.config.get("SQLITE_PRAGMAS"):
+            _install_sqlite_pragmas(engine, app.config["SQLITE_PRAGMAS"])
+        from app import metrics
+        metrics.init_app(app, engine)
+    _engines.add(engine)
+    from app import assets, templating
+    templating.init_app(app)
+    assets.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
     limiter.init_app(app)
@@ -130,7 +165,28 @@ def create_app():
         app.logger.addHandler(handler)
         app.logger.setLevel(logging.INFO)
 
-    with app.app_context():
-        db.create_all()
+    from app import identity  # noqa: F401  (registers the user loader)
+    from app.cache import fragment_cache, hours_cache, identity_cache
+    fragment_cache.maxsize = app.config["FRAGMENT_CACHE_SIZE"]
+    hours_cache.maxsize = app.config["HOURS_CACHE_SIZE"]
+    identity_cache.maxsize = app.config["USER_CACHE_SIZE"]
+    identity_cache.ttl = app.config["USER_CACHE_SECONDS"]
+
+    from app.archive import archive_entries_command
+    from app.migrations import migrate_command, upgrade
+    from app.rollup import rebuild_rollup_command
+    app.cli.add_command(archive_entries_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(rebuild_rollup_command)
+
+    # With AUTO_MIGRATE off, schema setup is left to `flask migrate` (run once
+    # by entrypoint.sh) and building the app never touches the database.
+    if app.config["AUTO_MIGRATE"]:
+        with app.app_context():
+            db.create_all()
+            upgrade()
+
+    from app.jobs import runner
+    runner.init_app(app)
 
     return app
@@ -1,16 +1,54 @@
-import json
-from datetime import datetime, timedelta, date
+import hmac
+import os
+from datetime import datetime, date
 from functools import wraps
 
-from flask import Response, current_app, flash, redirect, render_template, request, url_for
+from flask import (
+    Response,
+    abort,
+    current_app,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
 
-from app import db
+from app import db, jobs, live
 from app.admin import admin_bp
-from app.models import TimeEntry, User
+from app.backup import export_chunks, gzip_chunks
+from app.conditional import conditional, team_data_version, user_data_version
+from app.exports import (
+    payroll_csv,
+    team_entries_csv,
+    team_summary_csv,
+    user_entries_csv,
+)
+from app.metrics import registry as metrics_registry
+from app.models import Job, TimeEntry, User
+from app.payroll import PayrollRules, compute_payroll, default_period
+from app.reports import (
+    current_week_start,
+    decode_cursor,
+    entry_models,
+    parse_date_range,
+    team_range_summary,
+    team_week_summary,
+    user_entry_count,
+    user_entry_page,
+    user_range_hours,
+)
 
-_MAX_BACKUP_BYTES = 10 * 1024 * 1024  # 10 MB
 _MAX_NOTE_LEN = 200
+_ALREADY_OPEN = (
+    "This user already has an open entry. Add a clock-out time or close it first."
+)
+_MAX_PAYROLL_DAYS = 366
 
 
 def admin_required(f):
@@ -26,41 +64,67 @@ def admin_required(f):
 
 @admin_bp.route("/")
 @admin_required
+@conditional(team_data_version)
 def dashboard():
-    users = User.query.order_by(User.name).all()
-    now = datetime.now()
-    week_start = (now - timedelta(days=now.weekday())).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-
-    user_data = []
-    dept_week_hours = 0.0
-    for user in users:
-        weekly_entries = TimeEntry.query.filter(
-            TimeEntry.user_id == user.id,
-            TimeEntry.clock_in >= week_start,
-            TimeEntry.clock_out.isnot(None),
-        ).all()
-        weekly_hours = sum(e.duration_hours for e in weekly_entries)
-        dept_week_hours += weekly_hours
-        active = TimeEntry.query.filter_by(user_id=user.id, clock_out=None).first()
-        user_data.append(
-            {
-                "user": user,
-                "weekly_hours": weekly_hours,
-                "is_active": active is not None,
-            }
-        )
+    user_data = team_week_summary(current_week_start())
+    dept_week_hours = sum(row["weekly_hours"] for row in user_data)
 
     return render_template(
         "admin/dashboard.html",
         user_data=user_data,
         dept_week_hours=dept_week_hours,
+        live_sequence=live.latest_sequence(),
+    )
+
+
+@admin_bp.route("/live")
+@admin_required
+def live_status():
+    """Server-Sent Events stream of team clock-status changes."""
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    if since is None:
+        since = live.latest_sequence()
+
+    latest, statuses = live.changes_since(since)
+    backlog = live.format_event(latest, statuses) if statuses else None
+    # The stream's feed starts after the backlog, so no event is sent twice.
+    subscriber = live.feed.subscribe(current_app._get_current_object(), latest)
+    if subscriber is None:
+        return Response(
+            "Too many live streams; retrying shortly.\n",
+            status=503,
+            mimetype="text/plain",
+            headers={"Retry-After": "30"},
+        )
+
+    return Response(
+        live.event_stream(
+            subscriber, latest, backlog, current_app.config["LIVE_STREAM_SECONDS"]
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@admin_bp.route("/metrics")
+def metrics():
+    token = current_app.config.get("METRICS_TOKEN")
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not (token and hmac.compare_digest(supplied, token)):
+        if not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        if not current_user.is_admin:
+            abort(403)
+    return Response(
+        metrics_registry.render(), mimetype="text/plain; version=0.0.4"
     )
 
 
 @admin_bp.route("/user/<int:user_id>")
 @admin_required
+@conditional(user_data_version)
 def user_report(user_id):
     user = db.session.get(User, user_id)
     if not user:
@@ -69,32 +133,29 @@ def user_report(user_id):
 
     start_str = request.args.get("start", "")
     end_str = request.args.get("end", "")
-
-    query = TimeEntry.query.filter_by(user_id=user_id)
-    if start_str:
-        try:
-            query = query.filter(
-                TimeEntry.clock_in >= datetime.fromisoformat(start_str)
-            )
-        except ValueError:
-            pass
-    if end_str:
-        try:
-            end_dt = datetime.fromisoformat(end_str).replace(
-                hour=23, minute=59, second=59
-            )
-            query = query.filter(TimeEntry.clock_in <= end_dt)
-        except ValueError:
-            pass
-
-    entries = query.order_by(TimeEntry.clock_in.desc()).all()
-    total_hours = sum(e.duration_hours for e in entries if e.clock_out)
+    start_dt, end_dt = parse_date_range(start_str, end_str)
+
+    models = entry_models(start_dt, user_id)
+    entries, newer, older = user_entry_page(
+        user_id,
+        start_dt,
+        end_dt,
+        current_app.config["REPORT_PAGE_SIZE"],
+        before=decode_cursor(request.args.get("before")),
+        after=decode_cursor(request.args.get("after")),
+        models=models,
+    )
+    total_hours = user_range_hours(user, start_dt, end_dt)
+    entry_count = user_entry_count(user_id, start_dt, end_dt, models)
 
     return render_template(
         "admin/user_report.html",
         user=user,
         entries=entries,
+        entry_count=entry_count,
         total_hours=total_hours,
+        newer_cursor=newer,
+        older_cursor=older,
         start_str=start_str,
         end_str=end_str,
     )
@@ -102,41 +163,14 @@ def user_report(user_id):
 
 @admin_bp.route("/report")
 @admin_required
+@conditional(team_data_version)
 def dept_report():
     start_str = request.args.get("start", "")
     end_str = request.args.get("end", "")
+    start_dt, end_dt = parse_date_range(start_str, end_str)
 
-    users = User.query.order_by(User.name).all()
-    report_data = []
-    dept_total = 0.0
-
-    for user in users:
-        query = TimeEntry.query.filter(
-            TimeEntry.user_id == user.id,
-            TimeEntry.clock_out.isnot(None),
-        )
-        if start_str:
-            try:
-                query = query.filter(
-                    TimeEntry.clock_in >= datetime.fromisoformat(start_str)
-                )
-            except ValueError:
-                pass
-        if end_str:
-            try:
-                end_dt = datetime.fromisoformat(end_str).replace(
-                    hour=23, minute=59, second=59
-                )
-                query = query.filter(TimeEntry.clock_in <= end_dt)
-            except ValueError:
-                pass
-
-        entries = query.all()
-        total = sum(e.duration_hours for e in entries)
-        dept_total += total
-        report_data.append(
-            {"user": user, "hours": total, "entry_count": len(entries)}
-        )
+    report_data = team_range_summary(start_dt, end_dt)
+    dept_total = sum(row["hours"] for row in report_data)
 
     return render_template(
         "admin/dept_report.html",
@@ -147,6 +181,114 @@ def dept_report():
     )
 
 
+def _csv_response(chunks, filename):
+    return Response(
+        stream_with_context(chunks),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _range_suffix(start_str, end_str):
+    return f"-{start_str or 'start'}-to-{end_str or 'now'}" if start_str or end_str else ""
+
+
+@admin_bp.route("/user/<int:user_id>/export.csv")
+@admin_required
+def user_report_csv(user_id):
+    user = db.session.get(User, user_id)
+    if not user:
+        flash("User not found.", "error")
+        return redirect(url_for("admin.dashboard"))
+
+    start_str = request.args.get("start", "")
+    end_str = request.args.get("end", "")
+    start_dt, end_dt = parse_date_range(start_str, end_str)
+
+    current_app.logger.info(
+        "Admin %s exported time card CSV for user %s", current_user.email, user_id
+    )
+    filename = f"timecard-{user.email.split('@')[0]}{_range_suffix(start_str, end_str)}.csv"
+    return _csv_response(user_entries_csv(user_id, start_dt, end_dt), filename)
+
+
+@admin_bp.route("/report/export.csv")
+@admin_required
+def dept_report_csv():
+    start_str = request.args.get("start", "")
+    end_str = request.args.get("end", "")
+    start_dt, end_dt = parse_date_range(start_str, end_str)
+
+    if request.args.get("detail"):
+        chunks = team_entries_csv(start_dt, end_dt)
+        filename = "department-entries"
+    else:
+        chunks = team_summary_csv(start_dt, end_dt)
+        filename = "department-report"
+    current_app.logger.info("Admin %s exported %s CSV", current_user.email, filename)
+    return _csv_response(chunks, f"{filename}{_range_suffix(start_str, end_str)}.csv")
+
+
+def _payroll_period():
+    """``(start, end)`` dates from the query string, else the current week."""
+    start, end = default_period()
+    try:
+        if request.args.get("start"):
+            start = date.fromisoformat(request.args["start"])
+        if request.args.get("end"):
+            end = date.fromisoformat(request.args["end"])
+    except ValueError:
+        pass
+    if end < start or (end - start).days >= _MAX_PAYROLL_DAYS:
+        return None
+    return start, end
+
+
+@admin_bp.route("/payroll")
+@admin_required
+@conditional(team_data_version)
+def payroll():
+    period = _payroll_period()
+    if period is None:
+        flash(
+            f"Choose a pay period of 1 to {_MAX_PAYROLL_DAYS} days, "
+            "ending on or after its start.",
+            "error",
+        )
+        return redirect(url_for("admin.payroll"))
+    start, end = period
+    rules = PayrollRules.from_config(current_app.config)
+    rows = compute_payroll(start, end, rules)
+
+    return render_template(
+        "admin/payroll.html",
+        rows=rows,
+        rules=rules,
+        start_str=start.isoformat(),
+        end_str=end.isoformat(),
+        total_regular=sum(row.regular_hours for row in rows),
+        total_overtime=sum(row.overtime_hours for row in rows),
+        total_gross=sum(row.gross_pay for row in rows),
+    )
+
+
+@admin_bp.route("/payroll/export.csv")
+@admin_required
+def payroll_csv_export():
+    period = _payroll_period()
+    if period is None:
+        flash("Invalid pay period.", "error")
+        return redirect(url_for("admin.payroll"))
+    start, end = period
+    detail = bool(request.args.get("detail"))
+    rows = compute_payroll(start, end, PayrollRules.from_config(current_app.config))
+
+    kind = "payroll-daily" if detail else "payroll"
+    filename = f"{kind}-{start.isoformat()}-to-{end.isoformat()}.csv"
+    current_app.logger.info("Admin %s exported %s", current_user.email, filename)
+    return _csv_response(payroll_csv(rows, detail), filename)
+
+
 @admin_bp.route("/entry/new/<int:user_id>", methods=["GET", "POST"])
 @admin_required
 def new_entry(user_id):
@@ -184,6 +326,9 @@ def new_entry(user_id):
             )
             flash("Time entry added.", "success")
             return redirect(url_for("admin.user_report", user_id=user_id))
+        except IntegrityError:
+            db.session.rollback()
+            flash(_ALREADY_OPEN, "error")
         except (ValueError, KeyError):
             flash("Invalid date/time format.", "error")
 
@@ -228,6 +373,9 @@ def edit_entry(entry_id):
             )
             flash("Time entry updated.", "success")
             return redirect(url_for("admin.user_report", user_id=entry.user_id))
+        except IntegrityError:
+            db.session.rollback()
+            flash(_ALREADY_OPEN, "error")
         except (ValueError, KeyError):
             flash("Invalid date/time format.", "error")
 
@@ -259,48 +407,20 @@ def delete_entry(entry_id):
 @admin_bp.route("/backup")
 @admin_required
 def backup():
-    users = User.query.all()
-    entries = TimeEntry.query.all()
-
-    data = {
-        "exported_at": datetime.now().isoformat(),
-        "app": "time-trackinator",
-        "users": [
-            {
-                "id": u.id,
-                "email": u.email,
-                "name": u.name,
-                "provider": u.provider,
-                "is_admin": u.is_admin,
-                "pay_rate": u.pay_rate,
-                "dark_mode": u.dark_mode,
-                "pay_period_start": (
-                    u.pay_period_start.isoformat() if u.pay_period_start else None
-                ),
-                "pay_period_end": (
-                    u.pay_period_end.isoformat() if u.pay_period_end else None
-                ),
-            }
-            for u in users
-        ],
-        "time_entries": [
-            {
-                "id": e.id,
-                "user_id": e.user_id,
-                "clock_in": e.clock_in.isoformat() if e.clock_in else None,
-                "clock_out": e.clock_out.isoformat() if e.clock_out else None,
-                "note": e.note,
-            }
-            for e in entries
-        ],
-    }
-
-    payload = json.dumps(data, indent=2)
+    compress = request.args.get("compress") == "gzip"
+    chunks = export_chunks()
     filename = f"timeclock-backup-{date.today().isoformat()}.json"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    else:
+        mimetype = "application/json"
+
     current_app.logger.info("Admin %s downloaded backup", current_user.email)
     return Response(
-        payload,
-        mimetype="application/json",
+        stream_with_context(chunks),
+        mimetype=mimetype,
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
@@ -313,76 +433,77 @@ def restore():
         if not f:
             flash("No file uploaded.", "error")
             return redirect(url_for("admin.restore"))
-        try:
-            raw = f.read(_MAX_BACKUP_BYTES + 1)
-            if len(raw) > _MAX_BACKUP_BYTES:
-                flash("Backup file exceeds the 10 MB size limit.", "error")
-                return redirect(url_for("admin.restore"))
-            data = json.loads(raw)
-            if data.get("app") != "time-trackinator":
-                flash("This does not appear to be a valid Time Trackinator backup.", "error")
-                return redirect(url_for("admin.restore"))
-
-            # Upsert users.
-            # is_admin is intentionally NOT restored from the backup — admin status
-            # is always derived from the ADMIN_EMAILS config on login, never from
-            # untrusted file data.  Restoring it would allow a crafted backup to
-            # silently promote arbitrary accounts to admin.
-            old_to_new_id = {}
-            for u_data in data.get("users", []):
-                user = User.query.filter_by(email=u_data["email"]).first()
-                if user is None:
-                    user = User(email=u_data["email"])
-                    db.session.add(user)
-                user.name = u_data.get("name", "")
-                user.provider = u_data.get("provider", "")
-                user.pay_rate = u_data.get("pay_rate", 0.0)
-                user.dark_mode = u_data.get("dark_mode", False)
-                if u_data.get("pay_period_start"):
-                    user.pay_period_start = date.fromisoformat(u_data["pay_period_start"])
-                if u_data.get("pay_period_end"):
-                    user.pay_period_end = date.fromisoformat(u_data["pay_period_end"])
-                db.session.flush()
-                old_to_new_id[u_data["id"]] = user.id
-
-            # Restore time entries (skip duplicates by clock_in + user)
-            for e_data in data.get("time_entries", []):
-                new_uid = old_to_new_id.get(e_data["user_id"])
-                if new_uid is None:
-                    continue
-                if not e_data.get("clock_in"):
-                    continue
-                ci = datetime.fromisoformat(e_data["clock_in"])
-                existing = TimeEntry.query.filter_by(
-                    user_id=new_uid, clock_in=ci
-                ).first()
-                if existing:
-                    continue
-                entry = TimeEntry(
-                    user_id=new_uid,
-                    clock_in=ci,
-                    clock_out=(
-                        datetime.fromisoformat(e_data["clock_out"])
-                        if e_data.get("clock_out")
-                        else None
-                    ),
-                    note=e_data.get("note", "")[:_MAX_NOTE_LEN],
-                )
-                db.session.add(entry)
+        job = jobs.enqueue(
+            "restore", current_user, {"filename": f.filename}, upload=f.stream
+        )
+        current_app.logger.info(
+            "Admin %s queued restore job %s", current_user.email, job.id
+        )
+        return redirect(url_for("admin.job_status", job_id=job.id))
 
-            db.session.commit()
-            current_app.logger.info(
-                "Admin %s restored backup (%d users, %d entries)",
-                current_user.email,
-                len(data.get("users", [])),
-                len(data.get("time_entries", [])),
-            )
-            flash("Backup restored successfully.", "success")
-            return redirect(url_for("admin.dashboard"))
+    recent_jobs = Job.query.order_by(Job.id.desc()).limit(10).all()
+    return render_template("admin/backup.html", jobs=recent_jobs)
+
+
+@admin_bp.route("/jobs/export", methods=["POST"])
+@admin_required
+def start_export():
+    compress = request.form.get("compress") == "gzip"
+    job = jobs.enqueue("export", current_user, {"compress": compress})
+    current_app.logger.info("Admin %s queued export job %s", current_user.email, job.id)
+    return redirect(url_for("admin.job_status", job_id=job.id))
 
-        except (json.JSONDecodeError, KeyError, ValueError):
-            db.session.rollback()
-            current_app.logger.warning("Admin %s restore failed", current_user.email, exc_info=True)
-            flash("Restore failed: the file appears to be corrupt or invalid.", "error")
 
-    return render_template("admin/backup.html")
+@admin_bp.route("/jobs/rebuild-rollup", methods=["POST"])
+@admin_required
+def start_rollup_rebuild():
+    job = jobs.enqueue("rebuild_rollup", current_user)
+    current_app.logger.info(
+        "Admin %s queued rollup rebuild job %s", current_user.email, job.id
+    )
+    return redirect(url_for("admin.job_status", job_id=job.id))
+
+
+@admin_bp.route("/jobs/archive", methods=["POST"])
+@admin_required
+def start_archive():
+    job = jobs.enqueue("archive", current_user)
+    current_app.logger.info("Admin %s queued archive job %s", current_user.email, job.id)
+    return redirect(url_for("admin.job_status", job_id=job.id))
+
+
+def _job_json(job):
+    fraction, progress_message = (None, None)
+    if job.status == "running":
+        fraction, progress_message = jobs.read_progress(current_app, job)
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "finished": job.finished,
+        "progress": fraction,
+        "message": progress_message or job.message,
+    }
+    if job.status == "succeeded" and job.result_name:
+        data["download_url"] = url_for("admin.job_download", job_id=job.id)
+    return data
+
+
+@admin_bp.route("/jobs/<int:job_id>")
+@admin_required
+def job_status(job_id):
+    job = db.get_or_404(Job, job_id)
+    if request.args.get("format") == "json":
+        return jsonify(_job_json(job))
+    return render_template("admin/job.html", job=job, status=_job_json(job))
+
+
+@admin_bp.route("/jobs/<int:job_id>/download")
+@admin_required
+def job_download(job_id):
+    job = db.get_or_404(Job, job_id)
+    path = jobs.job_path(current_app, job.id, "result")
+    if job.status != "succeeded" or not job.result_name or not os.path.exists(path):
+        abort(404)
+    current_app.logger.info("Admin %s downloaded backup", current_user.email)
+    return send_file(path, as_attachment=True, download_name=job.result_name)
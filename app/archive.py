@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from app.models import ArchivedTimeEntry, TimeEntry
+
+_ARCHIVE_BATCH = 1000
+
+_COLUMNS = ("id", "user_id", "clock_in", "clock_out", "note", "created_at", "updated_at")
+
+
+def archive_cutoff(days=None, now=None):
+    days = current_app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+    return (now or datetime.now()) - timedelta(days=days)
+
+
+def archive_entries(cutoff, batch_size=_ARCHIVE_BATCH, progress=None):
+    """Move closed entries that ended before ``cutoff`` into the archive.
+
+    Works in batches of ``batch_size`` rows and commits after each batch, so
+    writers are only held up briefly. The rows are copied and deleted with
+    Core statements, which bypass the rollup flush hooks: ``DailyHours``
+    keeps counting archived time. Returns the number of entries moved.
+    """
+    live = TimeEntry.__table__
+    archived = ArchivedTimeEntry.__table__
+    criteria = [live.c.clock_out.isnot(None), live.c.clock_out < cutoff]
+    total = db.session.scalar(db.select(func.count()).where(*criteria))
+
+    moved = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(live.c.id).where(*criteria).order_by(live.c.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        columns = [live.c[name] for name in _COLUMNS]
+        db.session.execute(
+            archived.insert().from_select(
+                list(_COLUMNS) + ["archived_at"],
+                db.select(*columns, db.literal(datetime.now())).where(
+                    live.c.id.in_(ids)
+                ),
+            )
+        )
+        db.session.execute(live.delete().where(live.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+        if progress is not None:
+            progress(moved / total if total else None, f"{moved} of {total} moved")
+    return moved
+
+
+@click.command("archive-entries")
+@click.option(
+    "--days",
+    type=int,
+    default=None,
+    help="Archive entries that ended more than this many days ago "
+    "(default: ARCHIVE_AFTER_DAYS).",
+)
+def archive_entries_command(days):
+    """Move old closed time entries into the archive table."""
+    cutoff = archive_cutoff(days)
+    moved = archive_entries(cutoff)
+    click.echo(f"Archived {moved} entries that ended before {cutoff:%Y-%m-%d %H:%M}.")
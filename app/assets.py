@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone covers every browser
+    brotli = None
+
+# Seconds a fingerprinted asset may be cached; its URL changes with its content.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+_MIN_COMPRESS_BYTES = 1024
+
+
+def _variants():
+    encodings = [("br", ".br")] if brotli is not None else []
+    return encodings + [("gzip", ".gz")]
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class AssetManifest:
+    """Content hashes of the files under the static folder.
+
+    ``url_for('static', filename=...)`` gains a ``v=<hash>`` argument, and a
+    request carrying the current hash is served as immutable. Precompressed
+    ``.br``/``.gz`` siblings are sent instead of the original when the client
+    accepts them.
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.hashes = {}
+        self.version = ""
+
+    def scan(self):
+        hashes = {}
+        for filename, path in self._files():
+            with open(path, "rb") as f:
+                hashes[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+        self.hashes = hashes
+        digest = hashlib.sha256(repr(sorted(hashes.items())).encode())
+        self.version = digest.hexdigest()[:12]
+
+    def _files(self):
+        if not self.static_folder or not os.path.isdir(self.static_folder):
+            return
+        for root, _, names in os.walk(self.static_folder):
+            for name in names:
+                if name.endswith((".gz", ".br")):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder)
+                yield filename.replace(os.sep, "/"), path
+
+    def compress(self):
+        """Write missing or stale compressed variants; returns files written."""
+        written = 0
+        for filename, path in self._files():
+            if os.path.splitext(filename)[1] not in _COMPRESSIBLE:
+                continue
+            if os.path.getsize(path) < _MIN_COMPRESS_BYTES:
+                continue
+            mtime = os.path.getmtime(path)
+            data = None
+            for encoding, suffix in _variants():
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                tmp = f"{target}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(_compress(data, encoding))
+                os.replace(tmp, target)
+                written += 1
+        return written
+
+    def url_defaults(self, endpoint, values):
+        if endpoint == "static" and "v" not in values:
+            digest = self.hashes.get(values.get("filename"))
+            if digest:
+                values["v"] = digest
+
+    def send(self, filename):
+        fingerprinted = request.args.get("v") == self.hashes.get(filename)
+        max_age = IMMUTABLE_MAX_AGE if fingerprinted else None
+        mimetype = mimetypes.guess_type(filename)[0]
+
+        accepted = request.accept_encodings
+        for encoding, suffix in _variants():
+            if not accepted[encoding]:
+                continue
+            path = safe_join(self.static_folder, filename + suffix)
+            if path is None or not os.path.isfile(path):
+                continue
+            response = send_from_directory(
+                self.static_folder, filename + suffix, mimetype=mimetype, max_age=max_age
+            )
+            response.content_encoding = encoding
+            break
+        else:
+            response = send_from_directory(
+                self.static_folder, filename, max_age=max_age
+            )
+
+        response.vary.add("Accept-Encoding")
+        if fingerprinted:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+
+def init_app(app):
+    manifest = AssetManifest(app.static_folder)
+    manifest.scan()
+    try:
+        manifest.compress()
+    except OSError as exc:
+        # A read-only image without prebuilt variants still works, uncompressed.
+        app.logger.warning("Could not precompress static assets: %s", exc)
+
+    app.extensions["assets"] = manifest
+    app.url_defaults(manifest.url_defaults)
+    app.view_functions["static"] = manifest.send
+
+
+def asset_version():
+    manifest = current_app.extensions.get("assets")
+    return manifest.version if manifest is not None else ""
+
@@ -0,0 +1,461 @@
+import codecs
+import itertools
+import json
+import zlib
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db, rollup
+from app.models import ArchivedTimeEntry, TimeEntry, User
+
+BACKUP_APP_ID = "time-trackinator"
+_EXPORT_BATCH = 1000
+_RESTORE_BATCH = 1000
+_READ_CHUNK = 64 * 1024
+# No single record in a backup comes close to this; a larger unparseable
+# value means the file is corrupt rather than merely split across chunks.
+_MAX_VALUE_CHARS = 1024 * 1024
+_MAX_NOTE_LEN = 200
+
+_USER_COLUMNS = (
+    User.id,
+    User.email,
+    User.name,
+    User.provider,
+    User.is_admin,
+    User.pay_rate,
+    User.dark_mode,
+    User.pay_period_start,
+    User.pay_period_end,
+)
+_ENTRY_COLUMNS = (
+    TimeEntry.id,
+    TimeEntry.user_id,
+    TimeEntry.clock_in,
+    TimeEntry.clock_out,
+    TimeEntry.note,
+)
+
+
+_ARCHIVED_COLUMNS = (
+    ArchivedTimeEntry.id,
+    ArchivedTimeEntry.user_id,
+    ArchivedTimeEntry.clock_in,
+    ArchivedTimeEntry.clock_out,
+    ArchivedTimeEntry.note,
+)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _user_record(row):
+    return {
+        "id": row.id,
+        "email": row.email,
+        "name": row.name,
+        "provider": row.provider,
+        "is_admin": row.is_admin,
+        "pay_rate": row.pay_rate,
+        "dark_mode": row.dark_mode,
+        "pay_period_start": _isoformat(row.pay_period_start),
+        "pay_period_end": _isoformat(row.pay_period_end),
+    }
+
+
+def _entry_record(row):
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "clock_in": _isoformat(row.clock_in),
+        "clock_out": _isoformat(row.clock_out),
+        "note": row.note,
+    }
+
+
+def _json_array(columns, order_by, to_record):
+    """Yield the rows of ``columns`` as the body of a JSON array, one batch at a time."""
+    result = db.session.execute(
+        db.select(*columns).order_by(order_by).execution_options(yield_per=_EXPORT_BATCH)
+    )
+    sep = ""
+    for batch in result.partitions():
+        yield sep + ",".join(
+            json.dumps(to_record(row), separators=(",", ":")) for row in batch
+        )
+        sep = ","
+
+
+def export_chunks():
+    """Yield a full JSON backup as text chunks without materializing the dataset.
+
+    Rows are fetched as plain column tuples in batches, so memory use stays
+    flat no matter how much history is exported. The document has the same
+    shape as earlier (indented) backups and restores the same way.
+    """
+    yield '{"exported_at":%s,"app":%s,"users":[' % (
+        json.dumps(datetime.now().isoformat()),
+        json.dumps(BACKUP_APP_ID),
+    )
+    yield from _json_array(_USER_COLUMNS, User.id, _user_record)
+    yield '],"time_entries":['
+    sep = ""
+    for chunk in _json_array(_ENTRY_COLUMNS, TimeEntry.id, _entry_record):
+        yield chunk
+        sep = ","
+    # Archived entries restore as ordinary entries.
+    for chunk in _json_array(_ARCHIVED_COLUMNS, ArchivedTimeEntry.id, _entry_record):
+        yield sep + chunk
+        sep = ""
+    yield "]}"
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress an iterable of text chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def is_gzip(raw):
+    return raw[:2] == b"\x1f\x8b"
+
+
+class InvalidBackup(ValueError):
+    """The upload is well-formed JSON but not a Time Trackinator backup."""
+
+
+class BackupTooLarge(ValueError):
+    """The (uncompressed) upload exceeds the configured size cap."""
+
+
+def _raw_chunks(stream):
+    while True:
+        raw = stream.read(_READ_CHUNK)
+        if not raw:
+            return
+        yield raw
+
+
+def _inflate(chunks):
+    # Bound each decompress() call so a small, highly compressed chunk can't
+    # expand into a large allocation before the size cap is checked.
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for raw in chunks:
+        while raw:
+            data = inflater.decompress(raw, _READ_CHUNK)
+            if data:
+                yield data
+            raw = inflater.unconsumed_tail
+    yield inflater.flush()
+
+
+def _text_chunks(stream, max_bytes):
+    """Yield decoded text from a plain or gzip-compressed upload stream."""
+    chunks = _raw_chunks(stream)
+    first = next(chunks, b"")
+    chunks = itertools.chain([first], chunks)
+    if is_gzip(first):
+        chunks = _inflate(chunks)
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    total = 0
+    for data in chunks:
+        total += len(data)
+        if total > max_bytes:
+            raise BackupTooLarge()
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+
+class _JSONStream:
+    """Minimal incremental reader for a top-level JSON object.
+
+    Top-level arrays are yielded one element at a time, so a backup with
+    hundreds of thousands of entries is never held in memory at once.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
+
+    def _error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise self._error("Unexpected end of data")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error(f"Expecting {char!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if len(self.buf) - self.pos > _MAX_VALUE_CHARS or not self._fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer edge may continue in the
+            # next chunk; re-parse once more data is available.
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def items(self):
+        """Yield ``(key, value)`` for each top-level field; arrays yield per element."""
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self.expect(":")
+            if self.peek() == "[":
+                self.pos += 1
+                if self.peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.value()
+                        if self.peek() == "]":
+                            self.pos += 1
+                            break
+                        self.expect(",")
+            else:
+                yield key, self.value()
+            if self.peek() == "}":
+                return
+            self.expect(",")
+
+
+def _user_values(u_data):
+    # is_admin is intentionally NOT restored from the backup — admin status
+    # is always derived from the ADMIN_EMAILS config on login, never from
+    # untrusted file data.  Restoring it would allow a crafted backup to
+    # silently promote arbitrary accounts to admin.
+    values = {
+        "name": u_data.get("name", ""),
+        "provider": u_data.get("provider", ""),
+        "pay_rate": u_data.get("pay_rate", 0.0),
+        "dark_mode": u_data.get("dark_mode", False),
+    }
+    if u_data.get("pay_period_start"):
+        values["pay_period_start"] = date.fromisoformat(u_data["pay_period_start"])
+    if u_data.get("pay_period_end"):
+        values["pay_period_end"] = date.fromisoformat(u_data["pay_period_end"])
+    return values
+
+
+class _Restorer:
+    """Merges backup records into the database with bulk statements.
+
+    Existing emails and ``(user_id, clock_in)`` keys are loaded once up
+    front; new rows are inserted with executemany in fixed-size batches,
+    and each batch is committed so punches never wait on the whole restore.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.email_to_id = dict(db.session.execute(db.select(User.email, User.id)).all())
+        self.old_id_to_email = {}
+        self.new_users = {}
+        self.user_updates = {}
+        self.old_to_new_id = None
+        self.existing_keys = None
+        self.open_users = None
+        self.new_entries = []
+        self.stats = {
+            "users": 0,
+            "entries": 0,
+            "entries_added": 0,
+            "open_skipped": 0,
+        }
+
+    def add_user(self, u_data):
+        self.stats["users"] += 1
+        email = u_data["email"]
+        self.old_id_to_email[u_data["id"]] = email
+        values = _user_values(u_data)
+        user_id = self.email_to_id.get(email)
+        if user_id is None:
+            self.new_users.setdefault(email, {"email": email}).update(values)
+        else:
+            self.user_updates.setdefault(user_id, {"id": user_id}).update(values)
+        if len(self.new_users) + len(self.user_updates) >= self.batch_size:
+            self._flush_users()
+
+    def _flush_users(self):
+        if self.new_users:
+            db.session.execute(db.insert(User), list(self.new_users.values()))
+            self.email_to_id.update(
+                db.session.execute(
+                    db.select(User.email, User.id).where(
+                        User.email.in_(list(self.new_users))
+                    )
+                ).all()
+            )
+            self.new_users = {}
+        if self.user_updates:
+            db.session.execute(db.update(User), list(self.user_updates.values()))
+            db.session.execute(
+                db.update(User)
+                .where(User.id.in_(list(self.user_updates)))
+                .values(identity_version=User.identity_version + 1)
+            )
+            self.user_updates = {}
+        db.session.commit()
+
+    def _start_entries(self):
+        self._flush_users()
+        self.old_to_new_id = {
+            old_id: self.email_to_id[email]
+            for old_id, email in self.old_id_to_email.items()
+        }
+        user_ids = set(self.old_to_new_id.values())
+        self.existing_keys = set()
+        # uq_time_entry_open allows one open entry per user; further open
+        # entries from the file are skipped.
+        self.open_users = set(
+            db.session.scalars(
+                db.select(TimeEntry.user_id).where(TimeEntry.clock_out.is_(None))
+            )
+        )
+        if user_ids:
+            for model in (TimeEntry, ArchivedTimeEntry):
+                result = db.session.execute(
+                    db.select(model.user_id, model.clock_in)
+                    .where(model.user_id.in_(user_ids))
+                    .execution_options(yield_per=_EXPORT_BATCH)
+                )
+                self.existing_keys.update(tuple(row) for row in result)
+
+    def add_entry(self, e_data):
+        if self.old_to_new_id is None:
+            self._start_entries()
+        self.stats["entries"] += 1
+        new_uid = self.old_to_new_id.get(e_data["user_id"])
+        if new_uid is None or not e_data.get("clock_in"):
+            return
+        ci = datetime.fromisoformat(e_data["clock_in"])
+        if (new_uid, ci) in self.existing_keys:
+            return
+        self.existing_keys.add((new_uid, ci))
+        co = None
+        if e_data.get("clock_out"):
+            co = datetime.fromisoformat(e_data["clock_out"])
+        else:
+            if new_uid in self.open_users:
+                self.stats["open_skipped"] += 1
+                return
+            self.open_users.add(new_uid)
+        self.new_entries.append(
+            {
+                "user_id": new_uid,
+                "clock_in": ci,
+                "clock_out": co,
+                "note": (e_data.get("note") or "")[:_MAX_NOTE_LEN],
+            }
+        )
+        if len(self.new_entries) >= self.batch_size:
+            self._flush_entries()
+
+    def _flush_entries(self):
+        if not self.new_entries:
+            return
+        closed = [row for row in self.new_entries if row["clock_out"] is not None]
+        opened = [row for row in self.new_entries if row["clock_out"] is None]
+        if closed:
+            db.session.execute(db.insert(TimeEntry), closed)
+        added = len(closed) + self._insert_open_entries(opened)
+        rollup.apply_rows(self.new_entries)
+        db.session.commit()
+        self.stats["entries_added"] += added
+        self.stats["open_skipped"] += len(self.new_entries) - added
+        self.new_entries = []
+
+    def _insert_open_entries(self, rows):
+        """Insert open entries, skipping users who already have one.
+
+        ``open_users`` was read when entries started; a user who clocks in
+        between two committed batches would otherwise fail the batch on
+        ``uq_time_entry_open``. Returns the number of rows inserted.
+        """
+        if not rows:
+            return 0
+        table = TimeEntry.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            stmt = insert(table).on_conflict_do_nothing(
+                index_elements=[table.c.user_id],
+                index_where=table.c.clock_out.is_(None),
+            )
+            return db.session.execute(stmt, rows).rowcount
+
+        added = 0
+        for row in rows:
+            if TimeEntry.open_for(row["user_id"]) is None:
+                db.session.execute(db.insert(TimeEntry), row)
+                added += 1
+        return added
+
+    def finish(self):
+        if self.old_to_new_id is None:
+            self._flush_users()
+        self._flush_entries()
+
+
+def restore_backup(stream, max_bytes, batch_size=_RESTORE_BATCH):
+    """Merge a backup upload into the database, committing batch by batch.
+
+    ``stream`` is a binary file object holding plain or gzip-compressed JSON.
+    The document is parsed incrementally and each batch of at most
+    ``batch_size`` rows is written and committed on its own, so SQLite's
+    write lock is held per batch rather than for the whole file. A restore
+    that fails partway keeps the batches already committed; restoring the
+    same file again skips them. Returns counts of records read and entries
+    added.
+    """
+    restorer = _Restorer(batch_size)
+    app_id = None
+    for key, value in _JSONStream(_text_chunks(stream, max_bytes)).items():
+        if key == "app":
+            app_id = value
+        elif key in ("users", "time_entries"):
+            if app_id != BACKUP_APP_ID:
+                raise InvalidBackup()
+            if key == "users":
+                restorer.add_user(value)
+            else:
+                restorer.add_entry(value)
+    if app_id != BACKUP_APP_ID:
+        raise InvalidBackup()
+    restorer.finish()
+    return restorer.stats
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded cache with least-recently-used eviction.
+
+    Each value is stored with a version tag and a lookup only hits when the
+    caller's current version matches. Versions live in the database, so a
+    write in one gunicorn worker invalidates every other worker's copy the
+    next time it reads the (already loaded) version.
+
+    With ``ttl`` (seconds), entries also expire that long after being set.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if (
+                item is _MISSING
+                or item[0] != version
+                or (item[2] is not None and item[2] < time.monotonic())
+            ):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, version, value):
+        with self._lock:
+            expires = time.monotonic() + self.ttl if self.ttl else None
+            self._data[key] = (version, value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, version, compute):
+        value = self.get(key, version, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, version, value)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Weekly and pay-period totals, keyed by (user_id, period, start, end) and
+# versioned by User.hours_version.
+hours_cache = LRUCache()
+
+# Rendered template blocks (report and time card rows), keyed by the block's
+# name and context and versioned by the values the block shows.
+fragment_cache = LRUCache()
+
+# Identity snapshots for load_user, keyed by user id and versioned by
+# User.identity_version.
+identity_cache = LRUCache(ttl=60)
@@ -0,0 +1,98 @@
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy import func
+
+from app import db
+from app.assets import asset_version
+from app.models import TimeEntry, User
+
+# Cached pages embed CSRF tokens, which expire (WTF_CSRF_TIME_LIMIT, 1 hour
+# by default). Rolling the ETag every half hour keeps a revalidated page's
+# forms usable.
+_ETAG_WINDOW = 1800
+
+
+def team_data_version():
+    """Row count and latest change across all users and entries, in one query."""
+    return db.session.execute(
+        db.select(
+            db.select(func.count(TimeEntry.id)).scalar_subquery(),
+            db.select(func.max(TimeEntry.updated_at)).scalar_subquery(),
+            db.select(func.count(User.id)).scalar_subquery(),
+            db.select(func.max(User.updated_at)).scalar_subquery(),
+        )
+    ).one()
+
+
+def user_data_version(user_id):
+    """Row count and latest change for one user's entries and profile."""
+    return db.session.execute(
+        db.select(
+            db.select(func.count(TimeEntry.id))
+            .where(TimeEntry.user_id == user_id)
+            .scalar_subquery(),
+            db.select(func.max(TimeEntry.updated_at))
+            .where(TimeEntry.user_id == user_id)
+            .scalar_subquery(),
+            db.select(User.updated_at).where(User.id == user_id).scalar_subquery(),
+        )
+    ).one()
+
+
+def _viewer_state():
+    # Everything base.html renders from the session or current user. The CSRF
+    # secret is created on first render, so make sure it exists up front.
+    generate_csrf()
+    return (
+        current_user.get_id(),
+        current_user.name,
+        current_user.is_admin,
+        current_user.dark_mode,
+        current_user.identity_version,
+        session.get("csrf_token"),
+    )
+
+
+def conditional(data_version):
+    """Answer ``304 Not Modified`` when nothing a page shows has changed.
+
+    ``data_version`` receives the view's arguments and returns a small tuple
+    that changes whenever the page's data does. It runs before the view, so
+    a matching ``If-None-Match`` costs that one query and no rendering.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            parts = (
+                request.full_path,
+                _viewer_state(),
+                data_version(**kwargs),
+                asset_version(),
+                date.today(),
+                time.time() // _ETAG_WINDOW,
+            )
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+            # Pending flash messages must be rendered, not skipped.
+            if request.if_none_match.contains(etag) and not session.get("_flashes"):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
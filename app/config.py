@@ -1,12 +1,80 @@
 import os
 
 
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _database_uri():
+    uri = os.environ.get("DATABASE_URL", "sqlite:////app/instance/timeclock.db")
+    # SQLAlchemy only accepts the "postgresql" scheme.
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def _rate_limit_storage_uri(database_uri):
+    """Keep rate-limit counters next to a SQLite database so all workers share them."""
+    if os.environ.get("RATELIMIT_STORAGE_URI"):
+        return os.environ["RATELIMIT_STORAGE_URI"]
+    if database_uri.startswith("sqlite:///"):
+        db_path = database_uri[len("sqlite:///"):]
+        return f"sqlite:///{os.path.join(os.path.dirname(db_path), 'ratelimit.db')}"
+    return "memory://"
+
+
+def _instance_dir(database_uri, env_name, name):
+    """Keep a data directory beside a SQLite database (the instance volume)."""
+    if os.environ.get(env_name):
+        return os.environ[env_name]
+    if database_uri.startswith("sqlite:///"):
+        db_path = database_uri[len("sqlite:///"):]
+        return os.path.join(os.path.dirname(db_path), name)
+    return os.path.abspath(os.path.join("instance", name))
+
+
+def _sqlite_pragmas(uri):
+    """Per-connection PRAGMAs for SQLite; empty for other databases or SQLITE_TUNING=0.
+
+    WAL lets readers proceed while a punch is being written, and
+    busy_timeout makes concurrent writers wait for the lock instead of
+    failing with "database is locked".
+    """
+    if not uri.startswith("sqlite") or os.environ.get("SQLITE_TUNING", "1") == "0":
+        return {}
+    return {
+        "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        # Negative cache_size is in KiB.
+        "cache_size": -_env_int("SQLITE_CACHE_SIZE_KB", 16384),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    }
+
+
+def _engine_options(uri):
+    if uri.startswith("sqlite"):
+        # The driver-level timeout covers the window before PRAGMAs run.
+        timeout = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000
+        return {"connect_args": {"timeout": timeout}}
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-change-me")
-    SQLALCHEMY_DATABASE_URI = os.environ.get(
-        "DATABASE_URL", "sqlite:////app/instance/timeclock.db"
-    )
+    SQLALCHEMY_DATABASE_URI = _database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = _sqlite_pragmas(SQLALCHEMY_DATABASE_URI)
+    # Create tables and apply migrations inside create_app(). The Docker
+    # entrypoint runs `flask migrate` once and turns this off for the workers.
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "1") != "0"
 
     # Microsoft OAuth
     MICROSOFT_CLIENT_ID = os.environ.get("MICROSOFT_CLIENT_ID", "")
@@ -17,6 +85,10 @@ class Config:
     GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "")
     GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", "")
 
+    # Providers' discovery documents are cached here, shared by all workers.
+    OAUTH_CACHE_DIR = _instance_dir(SQLALCHEMY_DATABASE_URI, "OAUTH_CACHE_DIR", "oauth")
+    OAUTH_METADATA_MAX_AGE = int(os.environ.get("OAUTH_METADATA_MAX_AGE", "86400"))
+
     # Access control
     ADMIN_EMAILS = [
         e.strip().lower()
@@ -40,7 +112,73 @@ class Config:
     from datetime import timedelta
     PERMANENT_SESSION_LIFETIME = timedelta(days=30)
 
-    # Cap upload size to prevent memory exhaustion from large backup files.
-    # The admin restore route enforces a tighter 10 MB check in code, but this
-    # Flask-level guard rejects oversized requests before they're read at all.
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
+    # Rate limiting (Flask-Limiter). The sqlite:// scheme is provided by
+    # app.ratelimit.SQLiteStorage.
+    RATELIMIT_STORAGE_URI = _rate_limit_storage_uri(SQLALCHEMY_DATABASE_URI)
+
+    # Instrumentation: Server-Timing response headers, and an optional bearer
+    # token that lets a Prometheus scraper read /admin/metrics without a login.
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") != "0"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+    # Entries per page on the admin time card.
+    REPORT_PAGE_SIZE = int(os.environ.get("REPORT_PAGE_SIZE", "100"))
+
+    # Per-worker LRU cache of weekly / pay-period hour totals (entries).
+    HOURS_CACHE_SIZE = int(os.environ.get("HOURS_CACHE_SIZE", "2048"))
+    # Per-worker snapshots of logged-in users, so most requests skip the user
+    # lookup. A user's own changes and admin rights are seen immediately; other
+    # changes a restore makes reach other workers' snapshots after this many
+    # seconds.
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+    USER_CACHE_SECONDS = int(os.environ.get("USER_CACHE_SECONDS", "60"))
+    # Compiled templates (shared by all workers) and per-worker cached table rows.
+    TEMPLATE_CACHE_DIR = _instance_dir(
+        SQLALCHEMY_DATABASE_URI, "TEMPLATE_CACHE_DIR", "template-cache"
+    )
+    FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", "10000"))
+
+    # Bulk punch endpoint (/punches). Kiosks authenticate with this bearer
+    # token and may punch for any user; signed-in users only for themselves.
+    KIOSK_TOKEN = os.environ.get("KIOSK_TOKEN", "")
+    MAX_PUNCH_BATCH = int(os.environ.get("MAX_PUNCH_BATCH", "1000"))
+
+    # Payroll rules. Punches are rounded to the nearest PAYROLL_ROUND_MINUTES
+    # (0 = exact); hours past the daily limit (0 = no daily rule) and regular
+    # hours past the weekly limit are overtime.
+    PAYROLL_ROUND_MINUTES = int(os.environ.get("PAYROLL_ROUND_MINUTES", "0"))
+    PAYROLL_DAILY_OVERTIME_HOURS = float(
+        os.environ.get("PAYROLL_DAILY_OVERTIME_HOURS", "0")
+    )
+    PAYROLL_WEEKLY_OVERTIME_HOURS = float(
+        os.environ.get("PAYROLL_WEEKLY_OVERTIME_HOURS", "40")
+    )
+    PAYROLL_OVERTIME_MULTIPLIER = float(
+        os.environ.get("PAYROLL_OVERTIME_MULTIPLIER", "1.5")
+    )
+
+    # Closed entries that ended more than this many days ago are moved to the
+    # archive table by `flask archive-entries` or the admin Maintenance card.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "400"))
+
+    # Background jobs (exports, restores, rollup rebuilds). Uploads and
+    # results are kept in JOB_DIR; running jobs whose progress file has not
+    # been touched for JOB_STALE_SECONDS are treated as interrupted.
+    JOB_DIR = _instance_dir(SQLALCHEMY_DATABASE_URI, "JOB_DIR", "jobs")
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+    JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "600"))
+    JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "7"))
+
+    # Live admin status feed (Server-Sent Events). Each open stream occupies a
+    # gunicorn thread, so streams per worker are capped and recycled; browsers
+    # reconnect on their own and resume from the last event they saw.
+    LIVE_POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", "1"))
+    LIVE_MAX_STREAMS = int(os.environ.get("LIVE_MAX_STREAMS", "2"))
+    LIVE_STREAM_SECONDS = int(os.environ.get("LIVE_STREAM_SECONDS", "300"))
+
+    # Restore parses uploads incrementally and never holds the file in memory,
+    # so the cap only bounds how much (uncompressed) data one restore may read.
+    MAX_BACKUP_BYTES = int(os.environ.get("MAX_BACKUP_MB", "200")) * 1024 * 1024
+    # Flask-level guard that rejects oversized requests before they're read at
+    # all. Uploads beyond a small threshold are spooled to disk by Werkzeug.
+    MAX_CONTENT_LENGTH = MAX_BACKUP_BYTES + 1024 * 1024
@@ -0,0 +1,179 @@
+import csv
+import io
+
+from app import db
+from app.models import User
+from app.reports import clock_in_range, entry_models, merge_sorted, team_range_summary
+
+_CSV_BATCH = 1000
+# Leading characters that make spreadsheet apps treat a cell as a formula.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+ENTRY_HEADER = ["date", "clock_in", "clock_out", "hours", "note"]
+TEAM_ENTRY_HEADER = ["email", "name"] + ENTRY_HEADER
+TEAM_SUMMARY_HEADER = ["email", "name", "hours", "entries"]
+PAYROLL_HEADER = [
+    "email",
+    "name",
+    "regular_hours",
+    "overtime_hours",
+    "total_hours",
+    "pay_rate",
+    "gross_pay",
+]
+PAYROLL_DETAIL_HEADER = ["email", "name", "date", "regular_hours", "overtime_hours"]
+
+
+def _safe(text):
+    text = text or ""
+    if text.startswith(_FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def _csv_chunks(header, batches):
+    """Yield CSV text one batch of rows at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _entry_cells(clock_in, clock_out, note):
+    hours = (clock_out - clock_in).total_seconds() / 3600 if clock_out else None
+    return [
+        clock_in.strftime("%Y-%m-%d"),
+        clock_in.strftime("%Y-%m-%d %H:%M"),
+        clock_out.strftime("%Y-%m-%d %H:%M") if clock_out else "",
+        f"{hours:.2f}" if hours is not None else "",
+        _safe(note),
+    ]
+
+
+def _batches(rows, size=_CSV_BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def user_entries_csv(user_id, start_dt=None, end_dt=None):
+    """Stream one user's entries in the range as CSV, oldest first.
+
+    Archived entries are merged in when the range reaches back to them.
+    """
+    streams = [
+        db.session.execute(
+            db.select(model.clock_in, model.id, model.clock_out, model.note)
+            .where(model.user_id == user_id, *clock_in_range(start_dt, end_dt, model))
+            .order_by(model.clock_in, model.id)
+            .execution_options(yield_per=_CSV_BATCH)
+        )
+        for model in entry_models(start_dt, user_id)
+    ]
+    rows = merge_sorted(streams, key=lambda row: (row.clock_in, row.id))
+    return _csv_chunks(
+        ENTRY_HEADER,
+        (
+            [_entry_cells(clock_in, clock_out, note) for clock_in, _, clock_out, note in batch]
+            for batch in _batches(rows)
+        ),
+    )
+
+
+def team_entries_csv(start_dt=None, end_dt=None):
+    """Stream every user's entries in the range as CSV, grouped by user."""
+    models = entry_models(start_dt)
+    streams = [
+        db.session.execute(
+            db.select(
+                User.name,
+                User.id,
+                model.clock_in,
+                model.id,
+                User.email,
+                model.clock_out,
+                model.note,
+            )
+            .join(model, model.user_id == User.id)
+            .where(*clock_in_range(start_dt, end_dt, model))
+            .order_by(User.name, User.id, model.clock_in, model.id)
+            .execution_options(yield_per=_CSV_BATCH)
+        )
+        for model in models
+    ]
+    if len(streams) > 1:
+        # Rank users the way the database sorted them, so the merge agrees
+        # with its collation and NULL ordering.
+        rank = {
+            user_id: i
+            for i, user_id in enumerate(
+                db.session.scalars(db.select(User.id).order_by(User.name, User.id))
+            )
+        }
+        rows = merge_sorted(streams, key=lambda row: (rank[row[1]], row[2], row[3]))
+    else:
+        rows = streams[0]
+    return _csv_chunks(
+        TEAM_ENTRY_HEADER,
+        (
+            [
+                [email, _safe(name)] + _entry_cells(clock_in, clock_out, note)
+                for name, _, clock_in, _, email, clock_out, note in batch
+            ]
+            for batch in _batches(rows)
+        ),
+    )
+
+
+def team_summary_csv(start_dt=None, end_dt=None):
+    """Department report totals as CSV (one row per user)."""
+    rows = [
+        [
+            row["user"].email,
+            _safe(row["user"].name),
+            f"{row['hours']:.2f}",
+            row["entry_count"],
+        ]
+        for row in team_range_summary(start_dt, end_dt)
+    ]
+    return _csv_chunks(TEAM_SUMMARY_HEADER, [rows])
+
+
+def payroll_csv(payroll, detail=False):
+    """Payroll run as CSV: one row per user, or per user-day with ``detail``."""
+    if detail:
+        rows = [
+            [
+                row.user.email,
+                _safe(row.user.name),
+                day.isoformat(),
+                f"{regular:.2f}",
+                f"{overtime:.2f}",
+            ]
+            for row in payroll
+            for day, regular, overtime in row.days
+        ]
+        return _csv_chunks(PAYROLL_DETAIL_HEADER, _batches(rows))
+    rows = [
+        [
+            row.user.email,
+            _safe(row.user.name),
+            f"{row.regular_hours:.2f}",
+            f"{row.overtime_hours:.2f}",
+            f"{row.total_hours:.2f}",
+            f"{row.user.pay_rate or 0:.2f}",
+            str(row.gross_pay),
+        ]
+        for row in payroll
+    ]
+    return _csv_chunks(PAYROLL_HEADER, [rows])
@@ -0,0 +1,104 @@
+from flask import has_request_context, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db, login_manager
+from app.cache import identity_cache
+from app.models import User
+
+# Everything a request reads from current_user. hours_version and updated_at
+# change with every punch, so they are left out and load lazily (one small
+# query) on the few pages that need them.
+IDENTITY_COLUMNS = (
+    "id",
+    "email",
+    "name",
+    "provider",
+    "is_admin",
+    "last_login",
+    "pay_rate",
+    "dark_mode",
+    "pay_period_start",
+    "pay_period_end",
+    "identity_version",
+)
+_TRACKED = IDENTITY_COLUMNS[1:-1]
+
+
+def _snapshot(user):
+    return {name: getattr(user, name) for name in IDENTITY_COLUMNS}
+
+
+def _from_snapshot(values):
+    # Attach without a SELECT: the snapshot becomes a clean persistent
+    # instance, so settings changes still flush as a normal UPDATE.
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    """Load the logged-in user, from this worker's snapshot when it is current.
+
+    The browser's session carries the ``identity_version`` it last saw. A
+    snapshot is used when its version matches and it is younger than
+    ``USER_CACHE_SECONDS``. A commit that changes the signed-in user drops
+    the version from their session, so their next request reloads them on
+    whichever worker serves it. Admin snapshots are also checked against
+    the stored version (one small query), so rights removed through another
+    worker (a restore) apply at once. Other changes to other users' rows
+    are picked up once the snapshot expires.
+    """
+    try:
+        user_id = int(user_id)
+    except (ValueError, TypeError):
+        return None
+    version = session.get("identity_version")
+    snapshot = identity_cache.get(user_id, version)
+    if snapshot is not None and snapshot["is_admin"]:
+        stored = db.session.scalar(
+            db.select(User.identity_version).where(User.id == user_id)
+        )
+        if stored != version:
+            snapshot = None
+    if snapshot is not None:
+        return _from_snapshot(snapshot)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        identity_cache.set(user_id, user.identity_version, _snapshot(user))
+        if version != user.identity_version:
+            session["identity_version"] = user.identity_version
+    return user
+
+
+@event.listens_for(db.session, "before_flush")
+def _bump_identity_version(session, flush_context, instances):
+    changed = session.info.setdefault("identity_changed", set())
+    for user in session.dirty:
+        if not isinstance(user, User):
+            continue
+        state = inspect(user)
+        if any(state.attrs[name].history.has_changes() for name in _TRACKED):
+            user.identity_version = User.identity_version + 1
+            changed.add(user.id)
+    for user in session.deleted:
+        if isinstance(user, User):
+            changed.add(user.id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _discard_identities(db_session):
+    changed = db_session.info.pop("identity_changed", ())
+    for user_id in changed:
+        identity_cache.discard(user_id)
+    # Other workers still hold a snapshot matching the version in this
+    # browser's session; without it, the next request reloads the user.
+    if has_request_context() and session.get("_user_id") in {str(i) for i in changed}:
+        session.pop("identity_version", None)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _keep_identities(session):
+    session.info.pop("identity_changed", None)
@@ -0,0 +1,338 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from app import db, rollup
+from app.archive import archive_cutoff, archive_entries
+from app.backup import (
+    BackupTooLarge,
+    InvalidBackup,
+    export_chunks,
+    gzip_chunks,
+    restore_backup,
+)
+from app.cache import identity_cache
+from app.models import Job
+
+# Progress is written at most this often (seconds) while a job runs.
+_PROGRESS_INTERVAL = 0.5
+_COPY_CHUNK = 64 * 1024
+
+_HANDLERS = {}
+
+
+class JobFailed(Exception):
+    """A job ended with a message meant for the admin who started it."""
+
+
+def job_handler(kind):
+    def decorator(f):
+        _HANDLERS[kind] = f
+        return f
+
+    return decorator
+
+
+def job_dir(app):
+    return app.config["JOB_DIR"]
+
+
+def job_path(app, job_id, suffix):
+    return os.path.join(job_dir(app), f"{job_id}.{suffix}")
+
+
+class Progress:
+    """Reports a running job's progress through a small JSON side file.
+
+    The job's own session holds the write transaction (for SQLite, the whole
+    database lock) until it commits, so progress goes to the filesystem,
+    where the status endpoint of any worker can read it. The file's mtime
+    doubles as the job's heartbeat.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._last = 0.0
+
+    def __call__(self, fraction=None, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last < _PROGRESS_INTERVAL:
+            return
+        self._last = now
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fraction": fraction, "message": message}, f)
+        os.replace(tmp, self.path)
+
+
+def read_progress(app, job):
+    """``(fraction, message)`` last reported by a running job."""
+    try:
+        with open(job_path(app, job.id, "progress")) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    return data.get("fraction"), data.get("message")
+
+
+class _CountingReader:
+    """File wrapper that reports how far through the file reading has got."""
+
+    def __init__(self, f, size, progress):
+        self._f = f
+        self._size = size or 1
+        self._progress = progress
+
+    def read(self, n=-1):
+        data = self._f.read(n)
+        self._progress(min(self._f.tell() / self._size, 1.0), "Restoring…")
+        return data
+
+
+def _megabytes(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+@job_handler("export")
+def _run_export(app, job, params, progress):
+    chunks = export_chunks()
+    filename = f"timeclock-backup-{date.today().isoformat()}.json"
+    if params.get("compress"):
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+
+    written = 0
+    with open(job_path(app, job.id, "result"), "wb") as out:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out.write(chunk)
+            written += len(chunk)
+            progress(None, f"{_megabytes(written)} written")
+    job.result_name = filename
+    return f"Backup ready ({_megabytes(written)})."
+
+
+@job_handler("restore")
+def _run_restore(app, job, params, progress):
+    path = job_path(app, job.id, "upload")
+    max_bytes = app.config["MAX_BACKUP_BYTES"]
+    try:
+        with open(path, "rb") as f:
+            reader = _CountingReader(f, os.path.getsize(path), progress)
+            stats = restore_backup(reader, max_bytes)
+    except BackupTooLarge:
+        raise JobFailed(
+            f"Backup file exceeds the {max_bytes // (1024 * 1024)} MB size limit."
+        )
+    except InvalidBackup:
+        raise JobFailed("This does not appear to be a valid Time Trackinator backup.")
+    except (json.JSONDecodeError, zlib.error, KeyError, TypeError, ValueError):
+        app.logger.warning("Restore job %s failed", job.id, exc_info=True)
+        raise JobFailed(
+            "Restore failed: the file appears to be corrupt or invalid. Entries"
+            " read before the error were kept; restoring a fixed file skips them."
+        )
+    finally:
+        # Batches commit as they go, so users may have changed even on failure.
+        identity_cache.clear()
+        if os.path.exists(path):
+            os.remove(path)
+    message = (
+        f"Backup restored: {stats['users']} users, {stats['entries']} entries "
+        f"({stats['entries_added']} added)."
+    )
+    if stats["open_skipped"]:
+        message += (
+            f" Skipped {stats['open_skipped']} open entries for users who were"
+            " already clocked in."
+        )
+    return message
+
+
+@job_handler("archive")
+def _run_archive(app, job, params, progress):
+    cutoff = archive_cutoff(params.get("days"))
+    moved = archive_entries(cutoff, progress=progress)
+    return f"Archived {moved} entries that ended before {cutoff:%Y-%m-%d}."
+
+
+@job_handler("rebuild_rollup")
+def _run_rebuild_rollup(app, job, params, progress):
+    rollup.rebuild()
+    db.session.commit()
+    return "Daily hours rollup rebuilt."
+
+
+class JobRunner:
+    """Runs queued jobs on a small per-process thread pool.
+
+    Jobs are rows in the ``job`` table; whichever process claims a row
+    (queued -> running, in one conditional UPDATE) runs it, so a job
+    submitted by one gunicorn worker survives that request and can be
+    finished by any worker if its original process goes away first.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._recovery = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["jobs"] = self
+        os.makedirs(job_dir(app), exist_ok=True)
+        app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            self.start()
+
+    def start(self):
+        """Start this process's pool; returns the future of its recovery pass."""
+        self._pool()
+        return self._recovery
+
+    def _pool(self):
+        # A pool inherited across fork() has no threads; make one per process.
+        # Nothing starts at import or in a preloading parent: the first
+        # request in each worker starts the pool and looks for stranded jobs.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config["JOB_WORKERS"],
+                    thread_name_prefix="job",
+                )
+                self._pid = os.getpid()
+                self._recovery = self._executor.submit(self._recover)
+            return self._executor
+
+    def _recover(self):
+        with self.app.app_context():
+            try:
+                orphans = self.recover()
+            finally:
+                db.session.remove()
+        for job_id in orphans:
+            self.submit(job_id)
+
+    def submit(self, job_id):
+        self._pool().submit(self._run, job_id)
+
+    def recover(self):
+        """Fail jobs whose process died mid-run; return ids of stranded queued jobs."""
+        stale = timedelta(seconds=self.app.config["JOB_STALE_SECONDS"])
+        now = datetime.now()
+        for job in Job.query.filter_by(status="running"):
+            try:
+                beat = datetime.fromtimestamp(
+                    os.path.getmtime(job_path(self.app, job.id, "progress"))
+                )
+            except OSError:
+                beat = job.started_at or job.created_at
+            if now - beat > stale:
+                job.status = "failed"
+                job.finished_at = now
+                job.message = "Interrupted: the server restarted while this job ran."
+        db.session.commit()
+        return [
+            job_id
+            for (job_id,) in db.session.query(Job.id).filter(
+                Job.status == "queued", Job.created_at < now - stale
+            )
+        ]
+
+    def _claim(self, job_id):
+        claimed = db.session.execute(
+            db.update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="running", started_at=datetime.now())
+        ).rowcount
+        db.session.commit()
+        return db.session.get(Job, job_id) if claimed else None
+
+    def _run(self, job_id):
+        app = self.app
+        with app.app_context():
+            job = self._claim(job_id)
+            if job is None:
+                db.session.remove()
+                return
+            try:
+                progress = Progress(job_path(app, job_id, "progress"))
+                progress(0.0, "Starting…", force=True)
+                params = json.loads(job.params or "{}")
+                try:
+                    message = _HANDLERS[job.kind](app, job, params, progress)
+                    status = "succeeded"
+                except JobFailed as e:
+                    db.session.rollback()
+                    message, status = str(e), "failed"
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Job %s (%s) failed", job_id, job.kind)
+                    message, status = "The job failed unexpectedly.", "failed"
+
+                job = db.session.get(Job, job_id)
+                job.status = status
+                job.message = message
+                job.finished_at = datetime.now()
+                db.session.commit()
+                app.logger.info("Job %s (%s) %s: %s", job_id, job.kind, status, message)
+            finally:
+                db.session.remove()
+                path = job_path(app, job_id, "progress")
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+runner = JobRunner()
+
+
+def enqueue(kind, user, params=None, upload=None):
+    """Record a job, stash its upload and hand it to this worker's pool."""
+    app = runner.app
+    prune(timedelta(days=app.config["JOB_RETENTION_DAYS"]))
+    staged = None
+    if upload is not None:
+        # Copy the upload before the job row is written: inserting it takes
+        # SQLite's write lock, and punches must not wait on a file copy.
+        fd, staged = tempfile.mkstemp(dir=job_dir(app), suffix=".staged")
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(upload, f, _COPY_CHUNK)
+    try:
+        job = Job(kind=kind, created_by=user.id, params=json.dumps(params or {}))
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        if staged is not None:
+            os.remove(staged)
+        raise
+    if staged is not None:
+        os.replace(staged, job_path(app, job.id, "upload"))
+    runner.submit(job.id)
+    return job
+
+
+def prune(max_age):
+    """Delete finished jobs (and their files) older than ``max_age``."""
+    cutoff = datetime.now() - max_age
+    old = Job.query.filter(
+        Job.status.in_(("succeeded", "failed")), Job.finished_at < cutoff
+    ).all()
+    for job in old:
+        for suffix in ("result", "upload"):
+            path = job_path(runner.app, job.id, suffix)
+            if os.path.exists(path):
+                os.remove(path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(old)
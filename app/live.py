@@ -0,0 +1,247 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import StatusChange, TimeEntry
+from app.reports import current_week_start, team_week_summary
+
+# Change-log rows older than this are pruned; a stream resuming from further
+# back gets a full snapshot instead.
+RETENTION = timedelta(minutes=15)
+_PRUNE_EVERY = 60
+_KEEPALIVE_SECONDS = 15
+_RETRY_MS = 5000
+# The poller re-reads this many ids below the newest it has seen; see
+# _poll_changes.
+_LATE_WINDOW = 200
+
+
+# Every flush that touches time entries appends the affected user ids to
+# status_change in the same transaction. Polling that table by sequence number
+# is what carries changes made in other gunicorn workers to this one.
+@event.listens_for(db.session, "before_flush")
+def _collect_status_changes(session, flush_context, instances):
+    user_ids = flush_context.attributes.setdefault("status_changed_users", set())
+    for entry in session.new:
+        if isinstance(entry, TimeEntry):
+            user_ids.add(entry.user_id)
+    for entry in session.deleted:
+        if isinstance(entry, TimeEntry) and inspect(entry).persistent:
+            user_ids.add(entry.user_id)
+    for entry in session.dirty:
+        if isinstance(entry, TimeEntry) and session.is_modified(entry):
+            user_ids.add(entry.user_id)
+            user_ids.update(inspect(entry).attrs.user_id.history.deleted)
+
+
+@event.listens_for(db.session, "after_flush")
+def _record_status_changes(session, flush_context):
+    user_ids = flush_context.attributes.get("status_changed_users")
+    if not user_ids:
+        return
+    now = datetime.now()
+    session.connection().execute(
+        StatusChange.__table__.insert(),
+        [{"user_id": user_id, "created_at": now} for user_id in sorted(user_ids)],
+    )
+    session.info["status_changed"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _wake_feed(session):
+    if session.info.pop("status_changed", False):
+        feed.notify()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_status_changes(session):
+    session.info.pop("status_changed", None)
+
+
+def latest_sequence():
+    return db.session.scalar(db.select(func.max(StatusChange.id))) or 0
+
+
+def user_status(user_ids=None):
+    """Current dashboard state for ``user_ids`` (default: everyone)."""
+    return [
+        {
+            "user_id": row["user"].id,
+            "active": row["is_active"],
+            "week_hours": round(row["weekly_hours"], 4),
+        }
+        for row in team_week_summary(current_week_start(), user_ids)
+    ]
+
+
+def changes_since(sequence):
+    """``(latest_sequence, statuses)`` for users changed after ``sequence``.
+
+    Falls back to every user's status when ``sequence`` predates the retained
+    change log.
+    """
+    oldest, latest = db.session.execute(
+        db.select(func.min(StatusChange.id), func.max(StatusChange.id))
+    ).one()
+    if latest is None or sequence >= latest:
+        return latest or 0, []
+    if sequence < oldest - 1:
+        return latest, user_status()
+    user_ids = db.session.scalars(
+        db.select(StatusChange.user_id).where(StatusChange.id > sequence).distinct()
+    ).all()
+    return latest, user_status(user_ids)
+
+
+def _poll_changes(sequence, seen):
+    """``(latest_sequence, user_ids, seen)`` for change-log rows not yet seen.
+
+    On PostgreSQL an id is drawn when the row is inserted, not when its
+    transaction commits, so a row can become visible after a higher id has
+    already been read. The last ``_LATE_WINDOW`` ids are therefore read
+    again and any id not in ``seen`` is reported. Pass the returned ``seen``
+    to the next poll; ``None`` (the first poll) treats everything up to
+    ``sequence`` as already delivered.
+    """
+    rows = db.session.execute(
+        db.select(StatusChange.id, StatusChange.user_id).where(
+            StatusChange.id > sequence - _LATE_WINDOW
+        )
+    ).all()
+    if seen is None:
+        seen = {change_id for change_id, _ in rows if change_id <= sequence}
+    user_ids = {user_id for change_id, user_id in rows if change_id not in seen}
+    latest = max([sequence] + [change_id for change_id, _ in rows])
+    seen = {change_id for change_id, _ in rows if change_id > latest - _LATE_WINDOW}
+    return latest, user_ids, seen
+
+
+def prune(now=None):
+    """Drop change-log rows past retention, always keeping the newest one."""
+    cutoff = (now or datetime.now()) - RETENTION
+    latest = latest_sequence()
+    db.session.execute(
+        db.delete(StatusChange).where(
+            StatusChange.created_at < cutoff, StatusChange.id < latest
+        )
+    )
+    db.session.commit()
+
+
+class StatusFeed:
+    """In-process fan-out of status changes to this worker's open streams.
+
+    A single poller thread reads new change-log rows, looks up those users'
+    current status and hands the event to every subscriber queue. Commits in
+    this worker wake it immediately. The thread starts with the first
+    subscriber and exits when the last one leaves, so idle workers never
+    touch the change log.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self, app, sequence):
+        """Register a new stream; returns its queue, or ``None`` when full.
+
+        ``sequence`` is the last change the stream's backlog covered; a
+        poller started for it begins there, so anything committed after the
+        backlog was read is sent once.
+        """
+        with self._lock:
+            if len(self._subscribers) >= app.config["LIVE_MAX_STREAMS"]:
+                return None
+            subscriber = queue.SimpleQueue()
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(app, sequence), name="live-status", daemon=True
+                )
+                self._thread.start()
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, sequence, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put((sequence, message))
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self, app, sequence):
+        interval = app.config["LIVE_POLL_SECONDS"]
+        with app.app_context():
+            last_prune = 0.0
+            seen = None
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                try:
+                    latest, user_ids, seen = _poll_changes(sequence, seen)
+                    statuses = user_status(user_ids) if user_ids else []
+                    if time.monotonic() - last_prune > _PRUNE_EVERY:
+                        prune()
+                        last_prune = time.monotonic()
+                except SQLAlchemyError:
+                    app.logger.exception("Live status poll failed")
+                    continue
+                finally:
+                    db.session.remove()
+                if statuses:
+                    self.publish(latest, format_event(latest, statuses))
+                sequence = latest
+
+
+feed = StatusFeed()
+
+
+def format_event(sequence, statuses):
+    return f"id: {sequence}\nevent: status\ndata: {json.dumps(statuses)}\n\n"
+
+
+def event_stream(subscriber, sequence, backlog, lifetime):
+    """Yield SSE frames for one client until ``lifetime`` seconds pass.
+
+    Events up to ``sequence`` were covered by ``backlog``; a poller that was
+    already running may still publish them, and they are skipped. Ending the
+    response frees the gunicorn thread; the browser reconnects after
+    ``retry`` and resumes with ``Last-Event-ID``.
+    """
+    deadline = time.monotonic() + lifetime
+    try:
+        yield f"retry: {_RETRY_MS}\n\n"
+        if backlog:
+            yield backlog
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event_sequence, message = subscriber.get(
+                    timeout=min(remaining, _KEEPALIVE_SECONDS)
+                )
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if event_sequence > sequence:
+                yield message
+    finally:
+        feed.unsubscribe(subscriber)
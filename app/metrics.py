@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import (
+    before_render_template,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from sqlalchemy import event
+
+# Request latency histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _EndpointStats:
+    __slots__ = (
+        "buckets", "count", "total", "queries", "db_seconds", "render_seconds"
+    )
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+_COUNTERS = (
+    ("trackinator_db_queries_total", "queries", "SQL statements executed."),
+    ("trackinator_db_seconds_total", "db_seconds", "Time spent in SQL."),
+    ("trackinator_render_seconds_total", "render_seconds", "Time spent rendering."),
+)
+
+
+def _labels(endpoint, method, status, pid):
+    return f'endpoint="{endpoint}",method="{method}",status="{status}",pid="{pid}"'
+
+
+class Registry:
+    """Per-worker request metrics, rendered in Prometheus text format.
+
+    Each gunicorn worker keeps its own registry; series carry a ``pid``
+    label so scrapes that land on different workers don't collide.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(_EndpointStats)
+
+    def observe(self, key, seconds, queries, db_seconds, render_seconds):
+        """Record one request; ``key`` is ``(endpoint, method, status)``."""
+        with self._lock:
+            stats = self._stats[key]
+            stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+            stats.count += 1
+            stats.total += seconds
+            stats.queries += queries
+            stats.db_seconds += db_seconds
+            stats.render_seconds += render_seconds
+
+    def render(self):
+        pid = os.getpid()
+        with self._lock:
+            items = [
+                (_labels(*key, pid), stats) for key, stats in sorted(self._stats.items())
+            ]
+
+        name = "trackinator_request_duration_seconds"
+        lines = [
+            f"# HELP {name} Request latency by endpoint.",
+            f"# TYPE {name} histogram",
+        ]
+        for labels, stats in items:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f"{name}_sum{{{labels}}} {stats.total}")
+            lines.append(f"{name}_count{{{labels}}} {stats.count}")
+
+        for name, attr, help_text in _COUNTERS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, stats in items:
+                lines.append(f"{name}{{{labels}}} {getattr(stats, attr)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# The start time rides on the statement's execution context: a statement
+# that raises never reaches after_cursor_execute, so nothing must be left
+# behind on the (pooled) connection for the next one to pick up.
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._metrics_started
+    if has_request_context():
+        g.metrics_queries = g.get("metrics_queries", 0) + 1
+        g.metrics_db_seconds = g.get("metrics_db_seconds", 0.0) + (
+            time.perf_counter() - started
+        )
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("metrics_render_started", []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    if has_request_context() and g.get("metrics_render_started"):
+        started = g.metrics_render_started.pop()
+        # Only the outermost render counts; includes are part of it.
+        if not g.metrics_render_started:
+            g.metrics_render_seconds = g.get("metrics_render_seconds", 0.0) + (
+                time.perf_counter() - started
+            )
+
+
+def init_app(app, engine):
+    """Record SQL, render and total time for every request.
+
+    Adds a ``Server-Timing`` header (unless SERVER_TIMING is off) and feeds
+    the per-endpoint histograms served by ``admin.metrics``.
+    """
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_timing(response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        queries = g.get("metrics_queries", 0)
+        db_seconds = g.get("metrics_db_seconds", 0.0)
+        render_seconds = g.get("metrics_render_seconds", 0.0)
+        registry.observe(
+            (request.endpoint or "unknown", request.method, response.status_code),
+            total,
+            queries,
+            db_seconds,
+            render_seconds,
+        )
+        if app.config.get("SERVER_TIMING"):
+            response.headers["Server-Timing"] = (
+                f'db;dur={db_seconds * 1000:.2f};desc="{queries} queries", '
+                f"render;dur={render_seconds * 1000:.2f}, "
+                f"total;dur={total * 1000:.2f}"
+            )
+        return response
@@ -0,0 +1,172 @@
+import click
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+
+from app import db
+from app.models import ArchivedTimeEntry, PunchReceipt, SchemaVersion, TimeEntry
+from app.rollup import rebuild as rebuild_rollup
+
+# Ordered (version, description, steps); a step is a SQL string or a
+# callable run inside the migration's transaction. db.create_all() only creates
+# missing tables, so anything that changes an existing table — indexes,
+# columns — must be added here. Statements must be idempotent so a fresh
+# database (where create_all already built the table with its indexes) and
+# two workers booting at once both end up in the same state.
+MIGRATIONS = [
+    (
+        1,
+        "Index time_entry on (user_id, clock_in) and open entries",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_time_entry_user_clock_in "
+            "ON time_entry (user_id, clock_in)",
+            "CREATE INDEX IF NOT EXISTS ix_time_entry_open "
+            "ON time_entry (user_id) WHERE clock_out IS NULL",
+        ],
+    ),
+    # hours_version only arrives in migration 3; nothing is cached before it.
+    (2, "Backfill daily_hours rollup", [lambda: rebuild_rollup(bump=False)]),
+    (
+        3,
+        "Add user.hours_version",
+        [lambda: _add_column("user", "hours_version", db.Integer(), "NOT NULL DEFAULT 0")],
+    ),
+    (
+        4,
+        "Add user.updated_at and index time_entry.updated_at",
+        [
+            lambda: _add_column("user", "updated_at", db.DateTime()),
+            "CREATE INDEX IF NOT EXISTS ix_time_entry_updated_at "
+            "ON time_entry (updated_at)",
+        ],
+    ),
+    (
+        5,
+        "Add user.identity_version",
+        [
+            lambda: _add_column(
+                "user", "identity_version", db.Integer(), "NOT NULL DEFAULT 0"
+            )
+        ],
+    ),
+    (
+        6,
+        "Allow one open time entry per user",
+        [
+            lambda: _close_duplicate_open_entries(),
+            "DROP INDEX IF EXISTS ix_time_entry_open",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_time_entry_open "
+            "ON time_entry (user_id) WHERE clock_out IS NULL",
+        ],
+    ),
+    (7, "Never reuse time_entry ids", [lambda: _autoincrement_time_entry()]),
+]
+
+
+def _add_column(table, column, type_, constraints=""):
+    connection = db.session.connection()
+    columns = {c["name"] for c in db.inspect(connection).get_columns(table)}
+    if column not in columns:
+        # Compile the type for the database in use (DATETIME on SQLite,
+        # TIMESTAMP WITHOUT TIME ZONE on PostgreSQL).
+        ddl = f"{type_.compile(dialect=connection.dialect)} {constraints}".strip()
+        db.session.execute(db.text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def _close_duplicate_open_entries():
+    # Before the unique index, a double tap could open two shifts. Keep each
+    # user's earliest open entry and close the others where they started, so
+    # no hours are invented.
+    seen = set()
+    open_entries = TimeEntry.query.filter_by(clock_out=None).order_by(
+        TimeEntry.user_id, TimeEntry.clock_in, TimeEntry.id
+    )
+    for entry in open_entries.all():
+        if entry.user_id not in seen:
+            seen.add(entry.user_id)
+            continue
+        entry.clock_out = entry.clock_in
+        entry.note = ((entry.note or "") + " [closed: duplicate clock-in]").strip()[:200]
+        current_app.logger.warning(
+            "Closed duplicate open entry %s for user %s", entry.id, entry.user_id
+        )
+    db.session.flush()
+
+
+def _autoincrement_time_entry():
+    # SQLite hands out max(id) + 1, so once the newest entry is archived or
+    # deleted its id comes back. AUTOINCREMENT can only be set by rebuilding
+    # the table. PostgreSQL sequences never reuse values.
+    connection = db.session.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    # Take the write lock before looking, so a second worker booting at the
+    # same time waits here and then finds the table already rebuilt.
+    connection.execute(db.text("UPDATE schema_version SET version = version WHERE 0"))
+    ddl = connection.scalar(
+        db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'time_entry'")
+    )
+    if "AUTOINCREMENT" in ddl.upper():
+        return
+
+    table = TimeEntry.__table__
+    create = str(CreateTable(table).compile(dialect=connection.dialect))
+    connection.execute(
+        db.text(create.replace("CREATE TABLE time_entry ", "CREATE TABLE time_entry_new ", 1))
+    )
+    columns = ", ".join(c.name for c in table.columns)
+    connection.execute(
+        db.text(f"INSERT INTO time_entry_new ({columns}) SELECT {columns} FROM time_entry")
+    )
+    connection.execute(db.text("DROP TABLE time_entry"))
+    connection.execute(db.text("ALTER TABLE time_entry_new RENAME TO time_entry"))
+    for index in table.indexes:
+        index.create(connection)
+
+    # Start past every id already handed out that is still referenced.
+    high = max(
+        connection.scalar(db.select(db.func.max(column))) or 0
+        for column in (table.c.id, ArchivedTimeEntry.id, PunchReceipt.entry_id)
+    )
+    connection.execute(db.text("DELETE FROM sqlite_sequence WHERE name = 'time_entry'"))
+    connection.execute(
+        db.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('time_entry', :seq)"),
+        {"seq": high},
+    )
+
+
+def current_version():
+    return db.session.query(db.func.max(SchemaVersion.version)).scalar() or 0
+
+
+def upgrade():
+    """Apply pending migrations in order. Returns the list of versions applied."""
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= current_version():
+            continue
+        try:
+            for step in steps:
+                if callable(step):
+                    step()
+                else:
+                    db.session.execute(db.text(step))
+            db.session.add(SchemaVersion(version=version, description=description))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker recorded this version first.
+            db.session.rollback()
+            continue
+        current_app.logger.info("Applied schema migration %d: %s", version, description)
+        applied.append(version)
+    return applied
+
+
+@click.command("migrate")
+def migrate_command():
+    """Create missing tables and apply pending schema migrations."""
+    db.create_all()
+    applied = upgrade()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    click.echo(f"Schema version: {current_version()}")
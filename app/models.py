@@ -2,7 +2,8 @@ from datetime import datetime, date
 
 from flask_login import UserMixin
 
-from app import db, login_manager
+from app import db
+from app.cache import hours_cache
 
 
 class User(UserMixin, db.Model):
@@ -16,56 +17,55 @@ class User(UserMixin, db.Model):
     dark_mode = db.Column(db.Boolean, default=False)
     pay_period_start = db.Column(db.Date, nullable=True)
     pay_period_end = db.Column(db.Date, nullable=True)
+    # Bumped whenever this user's entries change; versions cached hour totals.
+    hours_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # Bumped whenever a column cached by app.identity changes.
+    identity_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
 
     time_entries = db.relationship(
         "TimeEntry", back_populates="user", cascade="all, delete-orphan"
     )
 
+    def hours_between(self, start_day, end_day=None):
+        """Closed hours worked on ``start_day`` through ``end_day`` (inclusive)."""
+        query = db.session.query(
+            db.func.coalesce(db.func.sum(DailyHours.seconds), 0.0)
+        ).filter(DailyHours.user_id == self.id, DailyHours.day >= start_day)
+        if end_day is not None:
+            query = query.filter(DailyHours.day <= end_day)
+        return query.scalar() / 3600
+
     @property
     def active_entry(self):
-        return TimeEntry.query.filter_by(user_id=self.id, clock_out=None).first()
+        return TimeEntry.open_for(self.id)
+
+    def _cached_hours(self, period, start_day, end_day=None):
+        return hours_cache.get_or_compute(
+            (self.id, period, start_day, end_day),
+            self.hours_version,
+            lambda: self.hours_between(start_day, end_day),
+        )
 
     def get_weekly_hours(self):
         from datetime import timedelta
-        now = datetime.now()
-        week_start = (now - timedelta(days=now.weekday())).replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        entries = TimeEntry.query.filter(
-            TimeEntry.user_id == self.id,
-            TimeEntry.clock_in >= week_start,
-            TimeEntry.clock_out.isnot(None),
-        ).all()
-        return sum(e.duration_hours for e in entries)
+        today = date.today()
+        return self._cached_hours("week", today - timedelta(days=today.weekday()))
 
     def get_pay_period_hours(self):
         if not (self.pay_period_start and self.pay_period_end):
             return 0.0
-        pp_start = datetime.combine(self.pay_period_start, datetime.min.time())
-        pp_end = datetime.combine(self.pay_period_end, datetime.max.time())
-        entries = TimeEntry.query.filter(
-            TimeEntry.user_id == self.id,
-            TimeEntry.clock_in >= pp_start,
-            TimeEntry.clock_in <= pp_end,
-            TimeEntry.clock_out.isnot(None),
-        ).all()
-        return sum(e.duration_hours for e in entries)
+        return self._cached_hours(
+            "pay_period", self.pay_period_start, self.pay_period_end
+        )
 
     def __repr__(self):
         return f"<User {self.email}>"
 
 
-class TimeEntry(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    clock_in = db.Column(db.DateTime, nullable=False)
-    clock_out = db.Column(db.DateTime, nullable=True)
-    note = db.Column(db.String(200), default="")
-    created_at = db.Column(db.DateTime, default=datetime.now)
-    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
-
-    user = db.relationship("User", back_populates="time_entries")
-
+class EntryDurationMixin:
     @property
     def duration_hours(self):
         if self.clock_out is None:
@@ -79,13 +79,179 @@ class TimeEntry(db.Model):
         minutes = int((h % 1) * 60)
         return f"{hours}h {minutes:02d}m"
 
+
+class TimeEntry(EntryDurationMixin, db.Model):
+    __table_args__ = (
+        db.Index("ix_time_entry_user_clock_in", "user_id", "clock_in"),
+        db.Index("ix_time_entry_updated_at", "updated_at"),
+        # At most one open entry per user, enforced by the database so two
+        # clock-ins racing each other cannot both succeed.
+        db.Index(
+            "uq_time_entry_open",
+            "user_id",
+            unique=True,
+            sqlite_where=db.text("clock_out IS NULL"),
+            postgresql_where=db.text("clock_out IS NULL"),
+        ),
+        # Never hand out an id twice: archived entries and punch receipts
+        # keep ids of rows no longer in this table.
+        {"sqlite_autoincrement": True},
+    )
+
+    archived = False
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    clock_in = db.Column(db.DateTime, nullable=False)
+    clock_out = db.Column(db.DateTime, nullable=True)
+    note = db.Column(db.String(200), default="")
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    user = db.relationship("User", back_populates="time_entries")
+
+    @classmethod
+    def open_for(cls, user_id):
+        """The user's open entry, if any: one probe of ``uq_time_entry_open``."""
+        return cls.query.filter_by(user_id=user_id, clock_out=None).one_or_none()
+
+    @classmethod
+    def claim_open(cls, user_ids):
+        """Take the write lock on these users' open entries before closing them.
+
+        A concurrent request closing the same entry waits on this UPDATE until
+        our transaction ends, then finds nothing left to close, so a shift is
+        never closed (and counted in the rollup) twice. Returns the number of
+        open entries found.
+        """
+        return db.session.execute(
+            db.update(cls)
+            .where(cls.user_id.in_(user_ids), cls.clock_out.is_(None))
+            .values(updated_at=datetime.now())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
     def __repr__(self):
         return f"<TimeEntry {self.user_id} {self.clock_in}>"
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    try:
-        return db.session.get(User, int(user_id))
-    except (ValueError, TypeError):
-        return None
+class ArchivedTimeEntry(EntryDurationMixin, db.Model):
+    """A closed entry moved out of ``time_entry`` by ``app.archive``.
+
+    Keeps the original id. Archived entries are read-only history: they
+    still count in ``DailyHours`` and show up in reports whose range
+    reaches back to them.
+    """
+
+    __table_args__ = (
+        db.Index("ix_archived_time_entry_user_clock_in", "user_id", "clock_in"),
+        db.Index("ix_archived_time_entry_clock_in", "clock_in"),
+    )
+
+    archived = True
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    clock_in = db.Column(db.DateTime, nullable=False)
+    clock_out = db.Column(db.DateTime, nullable=False)
+    note = db.Column(db.String(200), default="")
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<ArchivedTimeEntry {self.user_id} {self.clock_in}>"
+
+
+class DailyHours(db.Model):
+    """Closed-entry time per user per calendar day, split at midnight.
+
+    Maintained from TimeEntry writes by ``app.rollup``. ``entry_count``
+    counts entries on the day they started.
+    """
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    seconds = db.Column(db.Float, nullable=False, default=0.0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyHours {self.user_id} {self.day}>"
+
+
+class PunchReceipt(db.Model):
+    """A punch accepted from the bulk endpoint, keyed by the client's id.
+
+    Resubmitting the same ``(user_id, idempotency_key)`` returns the stored
+    outcome instead of punching twice.
+    """
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id", "idempotency_key", name="uq_punch_receipt_user_key"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    idempotency_key = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(3), nullable=False)
+    punched_at = db.Column(db.DateTime, nullable=False)
+    entry_id = db.Column(db.Integer, db.ForeignKey("time_entry.id", ondelete="SET NULL"))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<PunchReceipt {self.user_id} {self.idempotency_key}>"
+
+
+class Job(db.Model):
+    """A background admin operation (export, restore, rollup rebuild).
+
+    Run by ``app.jobs``; ``status`` moves queued -> running -> succeeded or
+    failed. Files belonging to the job live in ``JOB_DIR``.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    params = db.Column(db.Text, default="{}")
+    created_by = db.Column(db.Integer, db.ForeignKey("user.id"))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    message = db.Column(db.String(500), default="")
+    result_name = db.Column(db.String(200))
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed")
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+
+class StatusChange(db.Model):
+    """Change log of users whose clock status or hours moved.
+
+    ``id`` is the sequence number live-status streams resume from; rows are
+    written by ``app.live`` and pruned after a short retention window.
+    """
+
+    # Sequence numbers must never be reused, even after the newest rows age out.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f"<StatusChange {self.id} {self.user_id}>"
+
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), default="")
+    applied_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<SchemaVersion {self.version}>"
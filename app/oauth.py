@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import time
+
+from authlib.integrations.flask_client import FlaskOAuth2App, OAuth
+from flask import current_app
+
+# Don't let an unresponsive identity provider hold a worker thread for long.
+_FETCH_TIMEOUT = 10
+
+
+def _metadata_path(name, url):
+    digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+    return os.path.join(current_app.config["OAUTH_CACHE_DIR"], f"{name}-{digest}.json")
+
+
+def _read_metadata(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_metadata(path, metadata):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp, path)
+    except OSError as exc:
+        current_app.logger.warning("Could not cache OAuth metadata: %s", exc)
+
+
+class CachedMetadataApp(FlaskOAuth2App):
+    """OAuth client whose discovery document is fetched once and kept on disk.
+
+    Authlib loads ``server_metadata_url`` on first use in every process.
+    This keeps the document under ``OAUTH_CACHE_DIR`` for
+    ``OAUTH_METADATA_MAX_AGE`` seconds, so new workers and restarts sign
+    people in without a round trip to the identity provider. A stale copy
+    is still used if the provider cannot be reached.
+    """
+
+    def load_server_metadata(self):
+        if not self._server_metadata_url or "_loaded_at" in self.server_metadata:
+            return self.server_metadata
+
+        path = _metadata_path(self.name, self._server_metadata_url)
+        cached = _read_metadata(path)
+        max_age = current_app.config["OAUTH_METADATA_MAX_AGE"]
+        if cached is None or time.time() - cached.get("_loaded_at", 0) > max_age:
+            try:
+                with self.client_cls(**self.client_kwargs) as session:
+                    resp = session.request(
+                        "GET",
+                        self._server_metadata_url,
+                        withhold_token=True,
+                        timeout=_FETCH_TIMEOUT,
+                    )
+                    resp.raise_for_status()
+                    metadata = resp.json()
+            except Exception:
+                if cached is None:
+                    raise
+                current_app.logger.warning(
+                    "Using cached %s OAuth metadata; refresh failed", self.name,
+                    exc_info=True,
+                )
+            else:
+                metadata["_loaded_at"] = time.time()
+                _write_metadata(path, metadata)
+                cached = metadata
+        self.server_metadata.update(cached)
+        return self.server_metadata
+
+
+class CachedMetadataOAuth(OAuth):
+    oauth2_client_cls = CachedMetadataApp
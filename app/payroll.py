@@ -0,0 +1,189 @@
+from array import array
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import groupby
+
+from app import db
+from app.models import User
+from app.reports import entry_models
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY = 86400.0
+# 1970-01-01 was a Thursday; shifts day numbers so weeks start on Monday.
+_MONDAY_OFFSET = 3
+_CENT = Decimal("0.01")
+
+
+class PayrollRules:
+    """Overtime and rounding policy applied to a payroll run.
+
+    ``round_minutes`` rounds every punch to the nearest increment (0 turns
+    rounding off). Hours past ``daily_overtime_hours`` in a day (0: no daily
+    rule) and regular hours past ``weekly_overtime_hours`` in a Monday-based
+    workweek are paid at ``overtime_multiplier``.
+    """
+
+    def __init__(
+        self,
+        round_minutes=0,
+        daily_overtime_hours=0,
+        weekly_overtime_hours=40,
+        overtime_multiplier=1.5,
+    ):
+        self.round_minutes = round_minutes
+        self.daily_overtime_hours = daily_overtime_hours
+        self.weekly_overtime_hours = weekly_overtime_hours
+        self.overtime_multiplier = overtime_multiplier
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            round_minutes=config["PAYROLL_ROUND_MINUTES"],
+            daily_overtime_hours=config["PAYROLL_DAILY_OVERTIME_HOURS"],
+            weekly_overtime_hours=config["PAYROLL_WEEKLY_OVERTIME_HOURS"],
+            overtime_multiplier=config["PAYROLL_OVERTIME_MULTIPLIER"],
+        )
+
+
+def _seconds(dt):
+    return (dt - _EPOCH).total_seconds()
+
+
+def _day_number(d):
+    return (d - _EPOCH.date()).days
+
+
+def _load_columns(first_day, end_day):
+    """Closed entries overlapping ``[first_day, end_day]`` as parallel arrays.
+
+    Naive local datetimes become seconds on a naive epoch, so local midnight
+    falls on multiples of a day.
+    """
+    lo = datetime.combine(first_day, datetime.min.time())
+    hi = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+    user_ids, starts, ends = array("q"), array("d"), array("d")
+    for model in entry_models(lo):
+        rows = db.session.execute(
+            db.select(model.user_id, model.clock_in, model.clock_out).where(
+                model.clock_out.isnot(None),
+                model.clock_in < hi,
+                model.clock_out > lo,
+            )
+        ).all()
+        if not rows:
+            continue
+        uid_col, in_col, out_col = zip(*rows)
+        user_ids.extend(uid_col)
+        starts.extend(map(_seconds, in_col))
+        ends.extend(map(_seconds, out_col))
+    return user_ids, starts, ends
+
+
+def _round_punches(column, minutes):
+    step = minutes * 60.0
+    return array("d", [round(t / step) * step for t in column])
+
+
+def _daily_seconds(user_ids, starts, ends):
+    """Sum worked seconds per ``(user_id, day_number)``, split at midnight."""
+    totals = defaultdict(float)
+    for user_id, start, end in zip(user_ids, starts, ends):
+        day = int(start // _DAY)
+        last = int(end // _DAY)
+        if day == last:
+            if end > start:
+                totals[user_id, day] += end - start
+            continue
+        while start < end:
+            boundary = min((day + 1) * _DAY, end)
+            totals[user_id, day] += boundary - start
+            start = boundary
+            day += 1
+    return totals
+
+
+def _user_week(item):
+    (user_id, day), _ = item
+    return user_id, (day + _MONDAY_OFFSET) // 7
+
+
+class PayrollRow:
+    __slots__ = ("user", "regular_hours", "overtime_hours", "gross_pay", "days")
+
+    def __init__(self, user):
+        self.user = user
+        self.regular_hours = 0.0
+        self.overtime_hours = 0.0
+        self.gross_pay = Decimal("0.00")
+        self.days = []
+
+    @property
+    def total_hours(self):
+        return self.regular_hours + self.overtime_hours
+
+
+def compute_payroll(start_day, end_day, rules):
+    """Regular/overtime hours and gross pay per user for ``start_day``–``end_day``.
+
+    Entries are fetched as plain columns (no ORM objects) into arrays and
+    processed in a few flat passes: punch rounding, a midnight split into
+    per-day totals, the daily overtime rule, and a running weekly total per
+    user. Open entries are not paid until they are closed. Weekly overtime needs
+    the whole workweek, so days before ``start_day`` in its first week are
+    loaded and counted toward the threshold but not paid. Returns
+    ``PayrollRow`` objects in user-name order; each has ``days``, a list of
+    ``(date, regular_hours, overtime_hours)``.
+    """
+    first_day = start_day - timedelta(days=start_day.weekday())
+    user_ids, starts, ends = _load_columns(first_day, end_day)
+    if rules.round_minutes:
+        starts = _round_punches(starts, rules.round_minutes)
+        ends = _round_punches(ends, rules.round_minutes)
+    totals = _daily_seconds(user_ids, starts, ends)
+
+    daily_limit = rules.daily_overtime_hours * 3600.0
+    weekly_limit = rules.weekly_overtime_hours * 3600.0
+    lo, hi = _day_number(first_day), _day_number(end_day)
+    paid_from = _day_number(start_day)
+
+    users = User.query.order_by(User.name, User.id).all()
+    rows = {user.id: PayrollRow(user) for user in users}
+
+    # Walk (user, day) totals in order, one user-workweek at a time.
+    for _, days in groupby(
+        sorted(item for item in totals.items() if lo <= item[0][1] <= hi),
+        key=_user_week,
+    ):
+        week_regular = 0.0
+        for (user_id, day), seconds in days:
+            overtime = max(seconds - daily_limit, 0.0) if daily_limit else 0.0
+            regular = seconds - overtime
+            if weekly_limit and week_regular + regular > weekly_limit:
+                spill = week_regular + regular - weekly_limit
+                regular -= spill
+                overtime += spill
+            week_regular += regular
+            row = rows.get(user_id)
+            if row is None or day < paid_from:
+                continue
+            row.regular_hours += regular / 3600
+            row.overtime_hours += overtime / 3600
+            row.days.append(
+                (_EPOCH.date() + timedelta(days=day), regular / 3600, overtime / 3600)
+            )
+
+    for row in rows.values():
+        rate = Decimal(str(row.user.pay_rate or 0))
+        paid_hours = Decimal(str(row.regular_hours)) + Decimal(
+            str(row.overtime_hours)
+        ) * Decimal(str(rules.overtime_multiplier))
+        row.gross_pay = (paid_hours * rate).quantize(_CENT, rounding=ROUND_HALF_UP)
+    return list(rows.values())
+
+
+def default_period(today=None):
+    """The current Monday-to-Sunday week."""
+    today = today or date.today()
+    start = today - timedelta(days=today.weekday())
+    return start, start + timedelta(days=6)
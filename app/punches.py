@@ -0,0 +1,219 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import PunchReceipt, TimeEntry, User
+
+PUNCH_KINDS = ("in", "out")
+_MAX_KEY_LEN = 100
+# Ids outside a 64-bit INTEGER cannot exist and would overflow the driver.
+_MIN_ID, _MAX_ID = -(2**63), 2**63 - 1
+# Clocks on kiosks drift; punches further ahead than this are rejected.
+_FUTURE_SKEW = timedelta(minutes=5)
+
+
+class InvalidBatch(ValueError):
+    """The request body is not a list of punches we can process."""
+
+
+def _parse_timestamp(value):
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+class _Punch:
+    __slots__ = ("index", "key", "kind", "at", "user_ref", "user_id", "result")
+
+    def __init__(self, index, item):
+        self.index = index
+        self.user_id = None
+        self.result = None
+        if not isinstance(item, dict):
+            item = {}
+        self.key = item.get("key")
+        self.kind = item.get("type")
+        self.user_ref = item.get("user")
+        self.at = None
+        try:
+            self.at = _parse_timestamp(item.get("timestamp") or "")
+        except (TypeError, ValueError):
+            pass
+
+    def error(self):
+        if not isinstance(self.key, str) or not 0 < len(self.key) <= _MAX_KEY_LEN:
+            return f"key must be a string of 1-{_MAX_KEY_LEN} characters"
+        if self.kind not in PUNCH_KINDS:
+            return "type must be 'in' or 'out'"
+        if self.at is None:
+            return "timestamp must be an ISO 8601 date/time"
+        if self.at > datetime.now() + _FUTURE_SKEW:
+            return "timestamp is in the future"
+        return None
+
+    def finish(self, status, entry_id=None, error=None):
+        self.result = {"key": self.key, "status": status}
+        if entry_id is not None:
+            self.result["entry_id"] = entry_id
+        if error is not None:
+            self.result["error"] = error
+
+
+def _resolve_users(punches, default_user, allowed_user_id):
+    """Map each punch's ``user`` (id or email) to a user id, in one query."""
+    ids = {
+        p.user_ref
+        for p in punches
+        if isinstance(p.user_ref, int)
+        and not isinstance(p.user_ref, bool)
+        and _MIN_ID <= p.user_ref <= _MAX_ID
+    }
+    emails = {
+        p.user_ref.strip().lower() for p in punches if isinstance(p.user_ref, str)
+    }
+    by_id, by_email = {}, {}
+    if ids or emails:
+        rows = db.session.execute(
+            db.select(User.id, User.email).where(
+                or_(User.id.in_(ids), User.email.in_(emails))
+            )
+        )
+        for user_id, email in rows:
+            by_id[user_id] = user_id
+            by_email[email] = user_id
+
+    for p in punches:
+        if p.result is not None:
+            continue
+        if p.user_ref is None and default_user is not None:
+            p.user_id = default_user
+        elif isinstance(p.user_ref, bool):
+            p.user_id = None
+        elif isinstance(p.user_ref, int):
+            p.user_id = by_id.get(p.user_ref)
+        elif isinstance(p.user_ref, str):
+            p.user_id = by_email.get(p.user_ref.strip().lower())
+        if p.user_id is None:
+            p.finish("rejected", error="unknown user")
+        elif allowed_user_id is not None and p.user_id != allowed_user_id:
+            p.finish("rejected", error="not allowed to punch for this user")
+
+
+def _existing_receipts(punches):
+    keys = {p.key for p in punches if p.result is None}
+    if not keys:
+        return {}
+    rows = db.session.execute(
+        db.select(
+            PunchReceipt.user_id, PunchReceipt.idempotency_key, PunchReceipt.entry_id
+        ).where(PunchReceipt.idempotency_key.in_(keys))
+    )
+    return {(user_id, key): entry_id for user_id, key, entry_id in rows}
+
+
+def _open_entries(user_ids):
+    if not user_ids:
+        return {}
+    TimeEntry.claim_open(user_ids)
+    entries = TimeEntry.query.filter(
+        TimeEntry.user_id.in_(user_ids), TimeEntry.clock_out.is_(None)
+    ).order_by(TimeEntry.clock_in)
+    return {entry.user_id: entry for entry in entries}
+
+
+def _apply(punches):
+    receipts = _existing_receipts(punches)
+    pending = [p for p in punches if p.result is None]
+    open_entries = _open_entries({p.user_id for p in pending})
+
+    accepted, repeated = [], []
+    # Replay each user's punches in time order against their open entry.
+    for p in sorted(pending, key=lambda p: (p.user_id, p.at, p.index)):
+        receipt_key = (p.user_id, p.key)
+        if receipt_key in receipts:
+            repeated.append((p, receipts[receipt_key]))
+            continue
+        entry = open_entries.get(p.user_id)
+        if p.kind == "in":
+            if entry is not None:
+                p.finish("rejected", error="already clocked in")
+                continue
+            entry = TimeEntry(user_id=p.user_id, clock_in=p.at)
+            db.session.add(entry)
+            open_entries[p.user_id] = entry
+        else:
+            if entry is None:
+                p.finish("rejected", error="not clocked in")
+                continue
+            if p.at <= entry.clock_in:
+                p.finish("rejected", error="clock-out must be after clock-in")
+                continue
+            entry.clock_out = p.at
+            del open_entries[p.user_id]
+        receipts[receipt_key] = entry
+        accepted.append((p, entry))
+
+    # One flush assigns ids to the new entries; receipts then go in as a
+    # single multi-row insert.
+    db.session.flush()
+    if accepted:
+        db.session.execute(
+            db.insert(PunchReceipt),
+            [
+                {
+                    "user_id": p.user_id,
+                    "idempotency_key": p.key,
+                    "kind": p.kind,
+                    "punched_at": p.at,
+                    "entry_id": entry.id,
+                    "created_at": datetime.now(),
+                }
+                for p, entry in accepted
+            ],
+        )
+    for p, entry in accepted:
+        p.finish("clocked_in" if p.kind == "in" else "clocked_out", entry_id=entry.id)
+    for p, original in repeated:
+        entry_id = original.id if isinstance(original, TimeEntry) else original
+        p.finish("duplicate", entry_id=entry_id)
+
+
+def ingest_punches(items, default_user=None, allowed_user_id=None, max_items=None):
+    """Apply a batch of punches in one transaction; returns per-item results.
+
+    ``items`` are ``{"key", "type", "timestamp", "user"}`` dicts; ``user`` is
+    a user id or email and may be omitted when ``default_user`` is given.
+    ``allowed_user_id`` restricts the batch to that user's own punches.
+    Users, open entries and earlier receipts are loaded with one query each,
+    regardless of batch size. Results come back in input order with status
+    ``clocked_in``, ``clocked_out``, ``duplicate`` (key seen before; the
+    original ``entry_id`` is returned) or ``rejected`` (with ``error``).
+    Commits on success.
+    """
+    if not isinstance(items, list):
+        raise InvalidBatch("punches must be a list")
+    if max_items is not None and len(items) > max_items:
+        raise InvalidBatch(f"at most {max_items} punches per request")
+
+    for attempt in range(2):
+        punches = [_Punch(i, item) for i, item in enumerate(items)]
+        for p in punches:
+            error = p.error()
+            if error:
+                p.finish("rejected", error=error)
+        _resolve_users(punches, default_user, allowed_user_id)
+        try:
+            _apply(punches)
+            db.session.commit()
+            break
+        except IntegrityError:
+            # A concurrent request stored one of these keys first; run the
+            # batch again so those punches come back as duplicates.
+            db.session.rollback()
+            if attempt:
+                raise
+
+    return [p.result for p in punches]
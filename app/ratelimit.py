@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+from flask_limiter.util import get_remote_address
+from flask_login import current_user
+from limits.storage import Storage
+
+_SWEEP_INTERVAL = 60  # seconds between expired-counter sweeps per worker
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window rate-limit counters shared by every worker on the host.
+
+    Registered with ``limits`` under the ``sqlite://`` scheme (same path
+    rules as SQLAlchemy: ``sqlite:////abs/path.db``). Each increment is a
+    single upsert in an IMMEDIATE transaction, so workers never double
+    count, and expired counters are swept periodically so the table only
+    holds keys seen in the current window.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        path = urllib.parse.urlparse(uri).path[1:] if uri else ""
+        self.path = path or ":memory:"
+        self.timeout = float(options.get("timeout", 5))
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit "
+                "(key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL)"
+            )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self):
+        # Connections are per thread and per process, so a storage created
+        # before gunicorn forks never shares a handle with its children.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _maybe_sweep(self, conn, now):
+        if now >= self._next_sweep:
+            self._next_sweep = now + _SWEEP_INTERVAL
+            conn.execute("DELETE FROM rate_limit WHERE expiry <= ?", (now,))
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._transaction() as conn:
+            self._maybe_sweep(conn, now)
+            conn.execute(
+                "INSERT INTO rate_limit (key, value, expiry) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "value = CASE WHEN expiry <= ? THEN excluded.value "
+                "ELSE value + excluded.value END, "
+                "expiry = CASE WHEN expiry <= ? THEN excluded.expiry ELSE expiry END",
+                (key, amount, now + expiry, now, now),
+            )
+            row = conn.execute(
+                "SELECT value FROM rate_limit WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0]
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM rate_limit WHERE key = ? AND expiry > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT expiry FROM rate_limit WHERE key = ? AND expiry > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM rate_limit").rowcount
+
+    def clear(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rate_limit WHERE key = ?", (key,))
+
+
+def rate_limit_key():
+    """Signed-in users are limited individually; everyone else by client IP.
+
+    Behind the office NAT every employee shares one address, so keying
+    authenticated traffic by IP would make colleagues throttle each other.
+    """
+    if current_user.is_authenticated:
+        return f"user:{current_user.get_id()}"
+    return get_remote_address()
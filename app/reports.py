@@ -0,0 +1,278 @@
+import heapq
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import Float
+
+from app import db
+from app.models import ArchivedTimeEntry, DailyHours, TimeEntry, User
+
+
+class duration_seconds(FunctionElement):
+    """Seconds between two DateTime expressions, computed by the database."""
+
+    type = Float()
+    name = "duration_seconds"
+    inherit_cache = True
+
+
+@compiles(duration_seconds)
+def _duration_seconds_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "EXTRACT(EPOCH FROM (%s - %s))" % (
+        compiler.process(end, **kw),
+        compiler.process(start, **kw),
+    )
+
+
+@compiles(duration_seconds, "sqlite")
+def _duration_seconds_sqlite(element, compiler, **kw):
+    # SQLite stores DateTime as ISO text; julianday() parses it to fractional days.
+    start, end = list(element.clauses)
+    return "((julianday(%s) - julianday(%s)) * 86400.0)" % (
+        compiler.process(end, **kw),
+        compiler.process(start, **kw),
+    )
+
+
+def entry_seconds():
+    return duration_seconds(TimeEntry.clock_in, TimeEntry.clock_out)
+
+
+def current_week_start(now=None):
+    now = now or datetime.now()
+    return (now - timedelta(days=now.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def _open_entry_counts():
+    return (
+        db.select(TimeEntry.user_id, func.count().label("open_count"))
+        .where(TimeEntry.clock_out.is_(None))
+        .group_by(TimeEntry.user_id)
+        .subquery()
+    )
+
+
+def _rollup_totals(start_day=None, end_day=None):
+    criteria = []
+    if start_day is not None:
+        criteria.append(DailyHours.day >= start_day)
+    if end_day is not None:
+        criteria.append(DailyHours.day <= end_day)
+    return (
+        db.select(
+            DailyHours.user_id,
+            func.sum(DailyHours.seconds).label("seconds"),
+            func.sum(DailyHours.entry_count).label("entry_count"),
+        )
+        .where(*criteria)
+        .group_by(DailyHours.user_id)
+        .subquery()
+    )
+
+
+def team_week_summary(week_start, user_ids=None):
+    """One row per user: hours worked since ``week_start`` and open-entry flag.
+
+    Hours come from the daily rollup, so the statement reads at most seven
+    rows per user plus the (indexed) open entries. ``user_ids`` limits the
+    result to those users.
+    """
+    totals = _rollup_totals(week_start.date())
+    open_entries = _open_entry_counts()
+    stmt = (
+        db.select(
+            User,
+            func.coalesce(totals.c.seconds, 0.0),
+            func.coalesce(open_entries.c.open_count, 0),
+        )
+        .outerjoin(totals, totals.c.user_id == User.id)
+        .outerjoin(open_entries, open_entries.c.user_id == User.id)
+        .order_by(User.name)
+    )
+    if user_ids is not None:
+        stmt = stmt.where(User.id.in_(user_ids))
+
+    return [
+        {
+            "user": user,
+            "weekly_hours": seconds / 3600,
+            "is_active": open_count > 0,
+        }
+        for user, seconds, open_count in db.session.execute(stmt)
+    ]
+
+
+def parse_date_range(start_str, end_str):
+    """Parse report ``start``/``end`` query args into inclusive datetime bounds.
+
+    Unparseable values are ignored (returned as ``None``), matching the
+    forgiving behavior of the report filter forms.
+    """
+    start_dt = end_dt = None
+    if start_str:
+        try:
+            start_dt = datetime.fromisoformat(start_str)
+        except ValueError:
+            pass
+    if end_str:
+        try:
+            end_dt = datetime.fromisoformat(end_str).replace(
+                hour=23, minute=59, second=59
+            )
+        except ValueError:
+            pass
+    return start_dt, end_dt
+
+
+def clock_in_range(start_dt, end_dt, model=TimeEntry):
+    """Filter criteria restricting ``model.clock_in`` to the given bounds."""
+    criteria = []
+    if start_dt is not None:
+        criteria.append(model.clock_in >= start_dt)
+    if end_dt is not None:
+        criteria.append(model.clock_in <= end_dt)
+    return criteria
+
+
+def reaches_archive(start_dt=None, user_id=None):
+    """Whether archived entries (for ``user_id``, if given) start at or after ``start_dt``.
+
+    A single indexed probe; reports skip the archive table entirely when it
+    has nothing in their range.
+    """
+    criteria = clock_in_range(start_dt, None, ArchivedTimeEntry)
+    if user_id is not None:
+        criteria.append(ArchivedTimeEntry.user_id == user_id)
+    stmt = db.select(ArchivedTimeEntry.id).where(*criteria).limit(1)
+    return db.session.execute(stmt).first() is not None
+
+
+def entry_models(start_dt=None, user_id=None):
+    """The entry models a report over this range has to read."""
+    if reaches_archive(start_dt, user_id):
+        return (TimeEntry, ArchivedTimeEntry)
+    return (TimeEntry,)
+
+
+def merge_sorted(iterables, key, reverse=False):
+    """Merge per-table result streams that are each already in ``key`` order."""
+    if len(iterables) == 1:
+        return iter(iterables[0])
+    return heapq.merge(*iterables, key=key, reverse=reverse)
+
+
+def _day_bounds(start_dt, end_dt):
+    return (
+        start_dt.date() if start_dt is not None else None,
+        end_dt.date() if end_dt is not None else None,
+    )
+
+
+def team_range_summary(start_dt=None, end_dt=None):
+    """One row per user: closed hours and entry count for the days in range."""
+    totals = _rollup_totals(*_day_bounds(start_dt, end_dt))
+    stmt = (
+        db.select(
+            User,
+            func.coalesce(totals.c.seconds, 0.0),
+            func.coalesce(totals.c.entry_count, 0),
+        )
+        .outerjoin(totals, totals.c.user_id == User.id)
+        .order_by(User.name)
+    )
+
+    return [
+        {"user": user, "hours": seconds / 3600, "entry_count": entry_count}
+        for user, seconds, entry_count in db.session.execute(stmt)
+    ]
+
+
+def user_range_hours(user, start_dt=None, end_dt=None):
+    start_day, end_day = _day_bounds(start_dt, end_dt)
+    return user.hours_between(start_day or date.min, end_day)
+
+
+def encode_cursor(entry):
+    return f"{entry.clock_in.isoformat()}_{entry.id}"
+
+
+def decode_cursor(token):
+    """Parse a ``<clock_in>_<id>`` page cursor; returns ``None`` if malformed."""
+    if not token:
+        return None
+    clock_in, _, entry_id = token.rpartition("_")
+    try:
+        return datetime.fromisoformat(clock_in), int(entry_id)
+    except ValueError:
+        return None
+
+
+def _entry_page(model, user_id, start_dt, end_dt, per_page, before, after):
+    key = db.tuple_(model.clock_in, model.id)
+    query = model.query.filter(
+        model.user_id == user_id, *clock_in_range(start_dt, end_dt, model)
+    )
+    if after is not None:
+        return (
+            query.filter(key > after)
+            .order_by(model.clock_in, model.id)
+            .limit(per_page + 1)
+            .all()
+        )
+    if before is not None:
+        query = query.filter(key < before)
+    return (
+        query.order_by(model.clock_in.desc(), model.id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+
+
+def _page_key(entry):
+    return entry.clock_in, entry.id
+
+
+def user_entry_page(
+    user_id, start_dt, end_dt, per_page, before=None, after=None, models=None
+):
+    """One page of a user's entries, newest first, using keyset pagination.
+
+    ``before``/``after`` are decoded cursors; the page continues strictly
+    older than ``before`` or strictly newer than ``after`` on
+    ``(clock_in, id)``, so cost depends on the page size, not the offset.
+    Archived entries are merged in when the range reaches back to them
+    (``models`` from :func:`entry_models` saves re-checking). Returns
+    ``(entries, newer_cursor, older_cursor)``; a cursor is ``None`` when
+    there is nothing further in that direction.
+    """
+    pages = [
+        _entry_page(model, user_id, start_dt, end_dt, per_page, before, after)
+        for model in models or entry_models(start_dt, user_id)
+    ]
+    if after is not None:
+        rows = list(merge_sorted(pages, key=_page_key))[: per_page + 1]
+        has_more = len(rows) > per_page
+        entries = rows[:per_page][::-1]
+        newer = encode_cursor(entries[0]) if has_more else None
+        older = encode_cursor(entries[-1]) if entries else None
+        return entries, newer, older
+
+    rows = list(merge_sorted(pages, key=_page_key, reverse=True))[: per_page + 1]
+    entries = rows[:per_page]
+    newer = encode_cursor(entries[0]) if before is not None and entries else None
+    older = encode_cursor(entries[-1]) if len(rows) > per_page else None
+    return entries, newer, older
+
+
+def user_entry_count(user_id, start_dt=None, end_dt=None, models=None):
+    return sum(
+        db.session.query(func.count(model.id))
+        .filter(model.user_id == user_id, *clock_in_range(start_dt, end_dt, model))
+        .scalar()
+        for model in models or entry_models(start_dt, user_id)
+    )
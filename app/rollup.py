@@ -0,0 +1,166 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import ArchivedTimeEntry, DailyHours, TimeEntry, User
+
+_REBUILD_BATCH = 1000
+
+
+def split_by_day(clock_in, clock_out):
+    """Yield ``(day, seconds)`` for each calendar day an interval covers."""
+    start = clock_in
+    while start < clock_out:
+        next_midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+        end = min(clock_out, next_midnight)
+        yield start.date(), (end - start).total_seconds()
+        start = end
+
+
+def add_interval(deltas, user_id, clock_in, clock_out, sign=1):
+    """Accumulate one entry's contribution into a ``{(user_id, day): [s, n]}`` map."""
+    if clock_in is None or clock_out is None:
+        return
+    deltas[(user_id, clock_in.date())][1] += sign
+    for day, seconds in split_by_day(clock_in, clock_out):
+        deltas[(user_id, day)][0] += sign * seconds
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0.0, 0])
+
+
+def apply_deltas(connection, deltas):
+    """Add accumulated deltas to the rollup table with one upsert per batch."""
+    rows = [
+        {"user_id": user_id, "day": day, "seconds": seconds, "entry_count": count}
+        for (user_id, day), (seconds, count) in deltas.items()
+        if seconds or count
+    ]
+    if not rows:
+        return
+
+    table = DailyHours.__table__
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day],
+            set_={
+                "seconds": table.c.seconds + stmt.excluded.seconds,
+                "entry_count": table.c.entry_count + stmt.excluded.entry_count,
+            },
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        key = (table.c.user_id == row["user_id"]) & (table.c.day == row["day"])
+        updated = connection.execute(
+            table.update()
+            .where(key)
+            .values(
+                seconds=table.c.seconds + row["seconds"],
+                entry_count=table.c.entry_count + row["entry_count"],
+            )
+        )
+        if not updated.rowcount:
+            connection.execute(table.insert().values(**row))
+
+
+def _committed(entry, attr):
+    history = inspect(entry).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(entry, attr)
+
+
+@event.listens_for(db.session, "before_flush")
+def _collect_entry_changes(session, flush_context, instances):
+    deltas = flush_context.attributes.setdefault("daily_hours_deltas", _new_deltas())
+    for entry in session.new:
+        if isinstance(entry, TimeEntry):
+            add_interval(deltas, entry.user_id, entry.clock_in, entry.clock_out)
+    for entry in session.deleted:
+        if isinstance(entry, TimeEntry) and inspect(entry).persistent:
+            add_interval(
+                deltas,
+                _committed(entry, "user_id"),
+                _committed(entry, "clock_in"),
+                _committed(entry, "clock_out"),
+                sign=-1,
+            )
+    for entry in session.dirty:
+        if not isinstance(entry, TimeEntry) or not session.is_modified(entry):
+            continue
+        add_interval(
+            deltas,
+            _committed(entry, "user_id"),
+            _committed(entry, "clock_in"),
+            _committed(entry, "clock_out"),
+            sign=-1,
+        )
+        add_interval(deltas, entry.user_id, entry.clock_in, entry.clock_out)
+
+
+@event.listens_for(db.session, "after_flush")
+def _apply_entry_changes(session, flush_context):
+    deltas = flush_context.attributes.get("daily_hours_deltas")
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+        bump_hours_version(session.connection(), {user_id for user_id, _ in deltas})
+
+
+def bump_hours_version(connection, user_ids=None):
+    """Invalidate cached hour totals for ``user_ids`` (default: everyone) in every worker."""
+    table = User.__table__
+    stmt = table.update().values(hours_version=table.c.hours_version + 1)
+    if user_ids is not None:
+        if not user_ids:
+            return
+        stmt = stmt.where(table.c.id.in_(user_ids))
+    connection.execute(stmt)
+
+
+def apply_rows(rows):
+    """Fold TimeEntry rows inserted outside the ORM (bulk inserts) into the rollup."""
+    deltas = _new_deltas()
+    for row in rows:
+        add_interval(deltas, row["user_id"], row["clock_in"], row.get("clock_out"))
+    apply_deltas(db.session.connection(), deltas)
+    bump_hours_version(db.session.connection(), {user_id for user_id, _ in deltas})
+
+
+def rebuild(bump=True):
+    """Recompute the whole rollup table from live and archived entries. Does not commit.
+
+    ``bump=False`` leaves ``user.hours_version`` alone, for the migration that
+    first builds the table before that column exists.
+    """
+    deltas = _new_deltas()
+    for model in (TimeEntry, ArchivedTimeEntry):
+        result = db.session.execute(
+            db.select(model.user_id, model.clock_in, model.clock_out)
+            .where(model.clock_out.isnot(None))
+            .execution_options(yield_per=_REBUILD_BATCH)
+        )
+        for user_id, clock_in, clock_out in result:
+            add_interval(deltas, user_id, clock_in, clock_out)
+    db.session.execute(db.delete(DailyHours))
+    apply_deltas(db.session.connection(), deltas)
+    if bump:
+        bump_hours_version(db.session.connection())
+    return len(deltas)
+
+
+@click.command("rebuild-rollup")
+def rebuild_rollup_command():
+    """Recompute the daily_hours rollup from raw time entries."""
+    rows = rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt daily_hours: {rows} user-days")
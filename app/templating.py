@@ -0,0 +1,37 @@
+import os
+
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from app.cache import fragment_cache
+
+
+def cache_fragment(*key, version, caller):
+    """Jinja ``{% call %}`` target that reuses a rendered block.
+
+    ``key`` names the block (start it with the template's own label) and
+    everything outside the row that it renders, such as a report's date
+    range. ``version`` holds the row values the block shows, so an edited
+    row renders again and an unchanged one is served from the cache.
+    Blocks are shared by every viewer in this worker and must not contain
+    per-session values such as CSRF tokens.
+    """
+    return Markup(fragment_cache.get_or_compute(key, version, caller))
+
+
+def init_app(app):
+    """Set up template caching. Call before anything touches ``app.jinja_env``."""
+    cache_dir = app.config["TEMPLATE_CACHE_DIR"]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as exc:
+        app.logger.warning("Template bytecode cache disabled: %s", exc)
+    else:
+        # Compiled templates are reused across workers and restarts; Jinja
+        # checks each entry against the template source.
+        app.jinja_options = {
+            **app.jinja_options,
+            "bytecode_cache": FileSystemBytecodeCache(cache_dir),
+        }
+
+    app.add_template_global(cache_fragment)
@@ -1,33 +1,38 @@
-from datetime import datetime, timedelta, date
-
-from flask import flash, redirect, render_template, request, url_for
+import hmac
+from datetime import datetime, date
+
+from flask import (
+    current_app,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
 
-from app import db
+from app import csrf, db, limiter
+from app.conditional import conditional, user_data_version
 from app.models import TimeEntry
+from app.punches import InvalidBatch, ingest_punches
 from app.timeclock import timeclock_bp
 
 _MAX_NOTE_LEN = 200
+_ALREADY_OPEN = (
+    "You already have an open entry. Add a clock-out time or close it first."
+)
 
 
 @timeclock_bp.route("/")
 @login_required
+@conditional(lambda: user_data_version(current_user.id))
 def dashboard():
-    active_entry = TimeEntry.query.filter_by(
-        user_id=current_user.id, clock_out=None
-    ).first()
+    active_entry = TimeEntry.open_for(current_user.id)
 
     now = datetime.now()
-    week_start = (now - timedelta(days=now.weekday())).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-
-    weekly_entries = TimeEntry.query.filter(
-        TimeEntry.user_id == current_user.id,
-        TimeEntry.clock_in >= week_start,
-        TimeEntry.clock_out.isnot(None),
-    ).all()
-    weekly_hours = sum(e.duration_hours for e in weekly_entries)
+    weekly_hours = current_user.get_weekly_hours()
 
     pay_period_hours = current_user.get_pay_period_hours()
     pay_accrued = pay_period_hours * (current_user.pay_rate or 0)
@@ -53,15 +58,15 @@ def dashboard():
 @timeclock_bp.route("/clock-in", methods=["POST"])
 @login_required
 def clock_in():
-    existing = TimeEntry.query.filter_by(
-        user_id=current_user.id, clock_out=None
-    ).first()
-    if existing:
+    # uq_time_entry_open rejects a second open entry, even from a request
+    # racing this one on another device.
+    db.session.add(TimeEntry(user_id=current_user.id, clock_in=datetime.now()))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
         flash("You are already clocked in.", "warning")
         return redirect(url_for("timeclock.dashboard"))
-    entry = TimeEntry(user_id=current_user.id, clock_in=datetime.now())
-    db.session.add(entry)
-    db.session.commit()
     flash("Clocked in successfully.", "success")
     return redirect(url_for("timeclock.dashboard"))
 
@@ -69,18 +74,57 @@ def clock_in():
 @timeclock_bp.route("/clock-out", methods=["POST"])
 @login_required
 def clock_out():
-    entry = TimeEntry.query.filter_by(
-        user_id=current_user.id, clock_out=None
-    ).first()
-    if not entry:
+    if not TimeEntry.claim_open([current_user.id]):
+        db.session.rollback()
         flash("You are not currently clocked in.", "warning")
         return redirect(url_for("timeclock.dashboard"))
+    entry = TimeEntry.open_for(current_user.id)
     entry.clock_out = datetime.now()
     db.session.commit()
     flash(f"Clocked out. Session: {entry.duration_display}", "success")
     return redirect(url_for("timeclock.dashboard"))
 
 
+@timeclock_bp.route("/punches", methods=["POST"])
+@csrf.exempt
+@limiter.limit("60 per minute")
+def punches():
+    """Record a batch of queued punches from a kiosk or offline client.
+
+    Kiosks send ``Authorization: Bearer <KIOSK_TOKEN>`` and may punch for any
+    user. Signed-in users may only punch for themselves and must send the
+    CSRF token in ``X-CSRFToken`` like any other form post.
+    """
+    token = current_app.config.get("KIOSK_TOKEN")
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if token and hmac.compare_digest(supplied, token):
+        default_user = allowed_user_id = None
+    elif current_user.is_authenticated:
+        if current_app.config.get("WTF_CSRF_ENABLED", True):
+            csrf.protect()
+        default_user = current_user.id
+        allowed_user_id = None if current_user.is_admin else current_user.id
+    else:
+        return jsonify(error="authentication required"), 401
+
+    body = request.get_json(silent=True)
+    try:
+        results = ingest_punches(
+            body.get("punches") if isinstance(body, dict) else body,
+            default_user=default_user,
+            allowed_user_id=allowed_user_id,
+            max_items=current_app.config["MAX_PUNCH_BATCH"],
+        )
+    except InvalidBatch as e:
+        return jsonify(error=str(e)), 400
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    current_app.logger.info(f"Punch batch: {len(results)} item(s) {counts}")
+    return jsonify(results=results, counts=counts)
+
+
 @timeclock_bp.route("/entry/new", methods=["GET", "POST"])
 @login_required
 def new_entry():
@@ -108,6 +152,9 @@ def new_entry():
             db.session.commit()
             flash("Time entry added.", "success")
             return redirect(url_for("timeclock.dashboard"))
+        except IntegrityError:
+            db.session.rollback()
+            flash(_ALREADY_OPEN, "error")
         except (ValueError, KeyError):
             flash("Invalid date/time format.", "error")
 
@@ -141,6 +188,9 @@ def edit_entry(entry_id):
             db.session.commit()
             flash("Time entry updated.", "success")
             return redirect(url_for("timeclock.dashboard"))
+        except IntegrityError:
+            db.session.rollback()
+            flash(_ALREADY_OPEN, "error")
         except (ValueError, KeyError):
             flash("Invalid date/time format.", "error")
 
@@ -0,0 +1,157 @@
+"""Boot-time benchmark: how long until every worker has served a request.
+
+Mimics a gunicorn master starting ``--workers`` processes against an
+already migrated SQLite database (a restart or deploy):
+
+    legacy        no --preload; every worker runs create_all() and migrations
+    migrate-once  no --preload; schema left to the entrypoint (AUTO_MIGRATE=0)
+    preload       --preload with AUTO_MIGRATE=0; the app is built once, then forked
+
+Each worker answers ``GET /login`` and runs one query, so a pool wrongly
+shared across fork() would show up as a failure. The one-shot
+``flask migrate`` step the entrypoint runs is timed separately.
+
+    python -m bench.boot --workers 4 --repeat 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "legacy": {"preload": False, "auto_migrate": "1"},
+    "migrate-once": {"preload": False, "auto_migrate": "0"},
+    "preload": {"preload": True, "auto_migrate": "0"},
+}
+
+
+def _build_app():
+    from app import create_app
+
+    app = create_app()
+    app.logger.disabled = True
+    return app
+
+
+def _first_request(app):
+    from app import db
+
+    if app.test_client().get("/login").status_code != 200:
+        raise RuntimeError("GET /login failed")
+    with app.app_context():
+        db.session.execute(db.text("SELECT COUNT(*) FROM user")).scalar()
+        db.session.remove()
+
+
+def _master(preload, workers):
+    """Run in a fresh interpreter: fork the workers and wait until all are ready."""
+    started = time.perf_counter()
+    app = _build_app() if preload else None
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                _first_request(app or _build_app())
+                code = 0
+            finally:
+                os._exit(code)
+        pids.append(pid)
+    ok = all(os.waitpid(pid, 0)[1] == 0 for pid in pids)
+    return {"ready_ms": (time.perf_counter() - started) * 1000, "ok": ok}
+
+
+def _migrate():
+    started = time.perf_counter()
+    from app import db
+    from app.migrations import upgrade
+
+    app = _build_app()
+    with app.app_context():
+        db.create_all()
+        upgrade()
+    return {"ready_ms": (time.perf_counter() - started) * 1000, "ok": True}
+
+
+def _spawn(args, env):
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.boot", *args],
+        cwd=_ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(workers, repeat):
+    workdir = tempfile.mkdtemp(prefix="trackinator-boot-")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{workdir}/boot.db",
+        SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark-secret-key-0123456789"),
+        AUTO_MIGRATE="0",
+        PYTHONPATH=_ROOT,
+    )
+    # The first migrate creates the schema; later ones find nothing to do,
+    # which is what the entrypoint sees on every restart.
+    _spawn(["--child", "migrate"], env)
+    timings = {("flask migrate", 1): [_spawn(["--child", "migrate"], env)]}
+
+    for _ in range(repeat):
+        # Interleave modes so drift in machine load hits them all alike.
+        for mode, options in MODES.items():
+            child_env = dict(env, AUTO_MIGRATE=options["auto_migrate"])
+            args = ["--child", "master", "--workers", str(workers)]
+            if options["preload"]:
+                args.append("--preload")
+            timings.setdefault((mode, workers), []).append(_spawn(args, child_env))
+
+    rows = []
+    for (mode, count), samples in timings.items():
+        values = [s["ready_ms"] for s in samples]
+        rows.append(
+            {
+                "mode": mode,
+                "workers": count,
+                "p50_ms": statistics.median(values),
+                "min_ms": min(values),
+                "ok": all(s["ok"] for s in samples),
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark application boot time.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", choices=("master", "migrate"), help=argparse.SUPPRESS)
+    parser.add_argument("--preload", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "master":
+        print(json.dumps(_master(args.preload, args.workers)))
+        return
+    if args.child == "migrate":
+        print(json.dumps(_migrate()))
+        return
+
+    for row in run(args.workers, args.repeat):
+        print(
+            f"{row['mode']:<22} {row['workers']:>2} worker(s)  "
+            f"p50 {row['p50_ms']:>8.1f} ms  min {row['min_ms']:>8.1f} ms"
+            f"{'' if row['ok'] else '  FAILED'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Behaviour checks for edge cases the route benchmarks don't reach.
+
+    python -m bench.checks
+
+Each check runs against a fresh throwaway SQLite database seeded with a
+few synthetic users and entries, through the Flask test client. Exits 1 if
+any check fails.
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHECKS = []
+
+
+def check(f):
+    _CHECKS.append(f)
+    return f
+
+
+class CheckFailed(AssertionError):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+@check
+def punch_user_id_out_of_range(app, user_ids):
+    """A user id no 64-bit INTEGER can hold is an unknown user, not a 500."""
+    from bench.run import login_client
+
+    punches = [
+        {"key": "huge", "type": "in", "timestamp": "2024-01-01T09:00:00", "user": 2**63},
+        {"key": "tiny", "type": "in", "timestamp": "2024-01-01T09:00:00", "user": -(2**63) - 1},
+    ]
+    for user_id in (user_ids[0], user_ids[1]):
+        response = login_client(app, user_id).post("/punches", json=punches)
+        expect(response.status_code == 200, f"HTTP {response.status_code}")
+        errors = [r.get("error") for r in response.get_json()["results"]]
+        expect(errors == ["unknown user"] * 2, f"results: {errors}")
+
+
+@check
+def live_stream_sends_each_event_once(app, user_ids):
+    """A resumed stream replays its backlog once, then only new changes."""
+    from bench.run import login_client
+
+    app.config.update(LIVE_POLL_SECONDS=0.1, LIVE_STREAM_SECONDS=1.5)
+    admin = login_client(app, user_ids[0])
+    clients = [login_client(app, user_id) for user_id in user_ids[1:]]
+    for client in clients[:2]:
+        client.post("/clock-out")
+        client.post("/clock-in")
+
+    def punch_later():
+        time.sleep(0.5)
+        clients[2].post("/clock-out")
+        clients[2].post("/clock-in")
+
+    response = admin.get("/admin/live", headers={"Last-Event-ID": "0"}, buffered=False)
+    later = threading.Thread(target=punch_later)
+    later.start()
+    body = b"".join(response.response).decode()
+    response.close()
+    later.join()
+
+    ids = re.findall(r"^id: (\d+)$", body, re.M)
+    expect(len(ids) >= 2, f"expected the backlog and one live event, got ids {ids}")
+    expect(len(ids) == len(set(ids)), f"event ids repeated: {ids}")
+
+
+@check
+def restore_commits_each_batch(app, user_ids):
+    """A restore commits per batch and survives a clock-in between batches."""
+    import io
+    import json
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import event
+
+    from app import db
+    from app.backup import export_chunks, restore_backup
+    from app.models import TimeEntry
+
+    with app.app_context():
+        user_id = user_ids[1]
+        db.session.execute(
+            db.delete(TimeEntry).where(
+                TimeEntry.user_id == user_id, TimeEntry.clock_out.is_(None)
+            )
+        )
+        db.session.commit()
+        doc = json.loads("".join(export_chunks()))
+        start = datetime(2001, 1, 1, 9)
+        doc["time_entries"] = [
+            {
+                "user_id": user_id,
+                "clock_in": (start + timedelta(days=n)).isoformat(),
+                "clock_out": (start + timedelta(days=n, hours=8)).isoformat(),
+            }
+            for n in range(5)
+        ] + [{"user_id": user_id, "clock_in": datetime.now().isoformat()}]
+        commits = []
+
+        # The user clocks in on another connection once the first batch lands.
+        def clock_in_elsewhere(session):
+            commits.append(1)
+            if len(commits) == 2:
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        db.insert(TimeEntry),
+                        {"user_id": user_id, "clock_in": datetime.now(), "note": ""},
+                    )
+
+        event.listen(db.session, "after_commit", clock_in_elsewhere)
+        try:
+            stats = restore_backup(io.BytesIO(json.dumps(doc).encode()), 10**8, 2)
+        finally:
+            event.remove(db.session, "after_commit", clock_in_elsewhere)
+        open_count = db.session.scalar(
+            db.select(db.func.count()).where(
+                TimeEntry.user_id == user_id, TimeEntry.clock_out.is_(None)
+            )
+        )
+        db.session.remove()
+
+    expect(len(commits) >= 4, f"expected a commit per batch, got {len(commits)}")
+    expect(stats["entries_added"] == 5, f"stats: {stats}")
+    expect(stats["open_skipped"] == 1, f"stats: {stats}")
+    expect(open_count == 1, f"user has {open_count} open entries")
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="trackinator-checks-")
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/checks.db"
+    os.environ.setdefault("SECRET_KEY", "behaviour-checks-secret-key-0123456789")
+
+    from app import create_app, db
+    from app.migrations import upgrade
+    from bench.datagen import generate
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    app.logger.disabled = True
+
+    failures = []
+    for f in _CHECKS:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            upgrade()
+            user_ids = generate(5, 10)
+            db.session.remove()
+        try:
+            f(app, user_ids)
+        except Exception as exc:
+            detail = str(exc) if isinstance(exc, CheckFailed) else traceback.format_exc()
+            failures.append(f"FAIL {f.__name__}: {detail}")
+        else:
+            print(f"ok   {f.__name__}")
+    return failures
+
+
+def main():
+    sys.path.insert(0, _ROOT)
+    failures = run()
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
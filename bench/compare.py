@@ -0,0 +1,42 @@
+"""Compare two ``bench.run`` JSON result files.
+
+    python -m bench.compare before.json after.json
+
+Prints p50 latency, query count and peak memory side by side for every
+(size, scenario) present in both runs, with the after/before latency ratio.
+"""
+import argparse
+import json
+
+
+def _load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return {(r["size"], r["scenario"]): r for r in report["results"]}, report["meta"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before, before_meta = _load(args.before)
+    after, after_meta = _load(args.after)
+    print(f"before: {before_meta.get('revision')}  after: {after_meta.get('revision')}")
+    print(
+        f"{'size':>12}  {'scenario':<28} {'p50 before':>11} {'p50 after':>10} "
+        f"{'ratio':>6} {'queries':>13} {'peak KiB':>19}"
+    )
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key], after[key]
+        ratio = a["p50_ms"] / b["p50_ms"] if b["p50_ms"] else float("inf")
+        print(
+            f"{key[0]:>12}  {key[1]:<28} {b['p50_ms']:>11.2f} {a['p50_ms']:>10.2f} "
+            f"{ratio:>6.2f} {b['queries']:>6}->{a['queries']:<6} "
+            f"{b['peak_kib']:>9.1f}->{a['peak_kib']:<9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
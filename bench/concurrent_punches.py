@@ -0,0 +1,174 @@
+"""Parallel clock-in/clock-out load against a shared SQLite database.
+
+Mimics ``gunicorn --workers=N --threads=T`` at shift change: every thread
+punches in and out for its own user as fast as it can, and any response
+that isn't the normal redirect counts as rejected. Meanwhile a separate
+process holds a read transaction open for ``--hold-read`` seconds, the
+way a long report or backup export does.
+
+    python bench/concurrent_punches.py                  # tuned engine profile
+    python bench/concurrent_punches.py --no-tuning      # rollback journal, no PRAGMAs
+
+Prints a JSON summary and exits 1 if any punch was rejected or any user
+ends with more than one open entry.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _make_app():
+    from app import create_app
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    return app
+
+
+def _punch_loop(app, user_id, cycles, counts, lock):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    ok = rejected = 0
+    for _ in range(cycles):
+        for path in ("/clock-in", "/clock-out"):
+            try:
+                response = client.post(path)
+                if response.status_code == 302:
+                    ok += 1
+                else:
+                    rejected += 1
+            except Exception:
+                rejected += 1
+    with lock:
+        counts["ok"] += ok
+        counts["rejected"] += rejected
+
+
+def _long_reader(db_path, seconds, started):
+    import sqlite3
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("BEGIN")
+    conn.execute("SELECT COUNT(*) FROM time_entry").fetchone()
+    started.set()
+    time.sleep(seconds)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def _worker(first_user_id, threads, cycles, queue):
+    app = _make_app()
+    app.logger.disabled = True
+    counts = {"ok": 0, "rejected": 0}
+    lock = threading.Lock()
+    pool = [
+        threading.Thread(
+            target=_punch_loop, args=(app, first_user_id + i, cycles, counts, lock)
+        )
+        for i in range(threads)
+    ]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    queue.put(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--cycles", type=int, default=50)
+    parser.add_argument("--hold-read", type=float, default=8.0, metavar="SECONDS")
+    parser.add_argument("--no-tuning", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="punch-bench-")
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-0123456789")
+    if args.no_tuning:
+        os.environ["SQLITE_TUNING"] = "0"
+
+    app = _make_app()
+    from app import db
+    from app.models import TimeEntry, User
+
+    total_users = args.workers * args.threads
+    with app.app_context():
+        db.session.add_all(
+            User(email=f"punch{i}@example.com", name=f"Punch {i}")
+            for i in range(total_users)
+        )
+        db.session.commit()
+        first_id = db.session.query(db.func.min(User.id)).scalar()
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=_worker,
+            args=(first_id + w * args.threads, args.threads, args.cycles, queue),
+        )
+        for w in range(args.workers)
+    ]
+    reader_started = ctx.Event()
+    reader = ctx.Process(
+        target=_long_reader, args=(f"{workdir}/bench.db", args.hold_read, reader_started)
+    )
+    if args.hold_read > 0:
+        reader.start()
+        reader_started.wait()
+
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    if args.hold_read > 0:
+        reader.join()
+
+    with app.app_context():
+        stored = TimeEntry.query.count()
+        journal = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+        several_open = dict(
+            db.session.execute(
+                db.select(TimeEntry.user_id, db.func.count())
+                .where(TimeEntry.clock_out.is_(None))
+                .group_by(TimeEntry.user_id)
+                .having(db.func.count() > 1)
+            ).all()
+        )
+
+    attempted = total_users * args.cycles * 2
+    summary = {
+        "tuning": not args.no_tuning,
+        "journal_mode": journal,
+        "workers": args.workers,
+        "threads": args.threads,
+        "hold_read_seconds": args.hold_read,
+        "punches_attempted": attempted,
+        "ok": sum(r["ok"] for r in results),
+        "rejected": sum(r["rejected"] for r in results),
+        "entries_stored": stored,
+        "users_with_several_open_entries": len(several_open),
+        "seconds": round(elapsed, 3),
+        "punches_per_second": round(attempted / elapsed, 1),
+    }
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["rejected"] or several_open else 0)
+
+
+if __name__ == "__main__":
+    main()
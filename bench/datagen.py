@@ -0,0 +1,87 @@
+"""Seeded synthetic data for benchmarks.
+
+Generates ``users`` employees with roughly ``entries_per_user`` punches
+each, working backwards from today: weekday day shifts (some split by a
+lunch punch), occasional overnight shifts that cross midnight, and a
+share of users currently clocked in.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+from app import db, rollup
+from app.models import TimeEntry, User
+
+_INSERT_BATCH = 5000
+
+
+def _shifts(rnd, entries, overnight_rate):
+    """Yield ``(clock_in, clock_out)`` pairs, newest day first."""
+    day = date.today() - timedelta(days=1)
+    produced = 0
+    while produced < entries:
+        if day.weekday() < 5 or rnd.random() < 0.1:
+            if rnd.random() < overnight_rate:
+                start = datetime.combine(day, datetime.min.time()) + timedelta(
+                    hours=rnd.uniform(19, 23)
+                )
+                yield start, start + timedelta(hours=rnd.uniform(6, 10))
+                produced += 1
+            else:
+                start = datetime.combine(day, datetime.min.time()) + timedelta(
+                    hours=rnd.uniform(6.5, 10), minutes=rnd.randint(0, 59)
+                )
+                length = timedelta(hours=rnd.uniform(6, 9.5))
+                if rnd.random() < 0.4 and produced + 2 <= entries:
+                    lunch = start + length / 2
+                    yield start, lunch
+                    yield lunch + timedelta(minutes=rnd.randint(20, 60)), start + length
+                    produced += 2
+                else:
+                    yield start, start + length
+                    produced += 1
+        day -= timedelta(days=1)
+
+
+def generate(users, entries_per_user, seed=1234, open_rate=0.3, overnight_rate=0.05):
+    """Insert synthetic users and entries and rebuild the rollup. Returns user ids.
+
+    The first user is an admin. Inserts bypass the ORM for speed, so the
+    daily rollup is rebuilt once at the end.
+    """
+    rnd = random.Random(seed)
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "email": f"user{i:05d}@example.com",
+                "name": f"Employee {i:05d}",
+                "provider": "google",
+                "is_admin": i == 0,
+                "pay_rate": round(rnd.uniform(15, 45), 2),
+            }
+            for i in range(users)
+        ],
+    )
+    user_ids = list(db.session.execute(db.select(User.id).order_by(User.id)).scalars())
+
+    batch = []
+    for user_id in user_ids:
+        for clock_in, clock_out in _shifts(rnd, entries_per_user, overnight_rate):
+            batch.append({"user_id": user_id, "clock_in": clock_in, "clock_out": clock_out})
+        if rnd.random() < open_rate:
+            batch.append(
+                {
+                    "user_id": user_id,
+                    "clock_in": datetime.now() - timedelta(hours=rnd.uniform(0.5, 6)),
+                    "clock_out": None,
+                }
+            )
+        if len(batch) >= _INSERT_BATCH:
+            db.session.execute(db.insert(TimeEntry), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(TimeEntry), batch)
+
+    rollup.rebuild()
+    db.session.commit()
+    return user_ids
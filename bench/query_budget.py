@@ -0,0 +1,217 @@
+"""Guard routes against N+1 query regressions.
+
+    python -m bench.query_budget
+
+Seeds a small and a larger synthetic dataset, requests every route and
+compares the number of SQL statements against a fixed budget. Budgets for
+list pages don't depend on the data size, so a per-user or per-row query
+loop fails at the larger size even if it fits at the smaller one. On
+failure the report lists the statements that were repeated within the
+request, which is where the N+1 usually is. Exits 1 if any budget is
+exceeded.
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (label, budget, request). ``budget`` is an int or a callable taking the
+# number of entries in the dataset, for routes that legitimately scale with
+# it in batches (restore writes 1000 rows per statement).
+_RESTORE_BATCH = 1000
+
+
+def _checks(app, recorder, user_ids, backup_bytes):
+    from bench.run import login_client, wait_for_job
+
+    admin = login_client(app, user_ids[0])
+    employee = login_client(app, user_ids[1])
+    puncher = login_client(app, user_ids[-1])
+    target = user_ids[len(user_ids) // 2]
+
+    def drain(response):
+        for _ in response.response:
+            pass
+        response.close()
+        return response
+
+    def restore():
+        # The upload is queued as a job; count the job's statements too, but
+        # not the status polls.
+        response = admin.post(
+            "/admin/restore",
+            data={"backup_file": (io.BytesIO(backup_bytes), "backup.json")},
+            content_type="multipart/form-data",
+        )
+        with recorder.paused():
+            wait_for_job(admin, response)
+        return response
+
+    # Each client's first request loads its user; later ones are served from
+    # the identity cache (for the admin, after a one-column version check).
+    return [
+        ("timeclock.dashboard", 6, lambda: employee.get("/")),
+        ("timeclock.clock_in", 3, lambda: puncher.post("/clock-in")),
+        ("timeclock.clock_out", 7, lambda: puncher.post("/clock-out")),
+        ("admin.dashboard", 4, lambda: admin.get("/admin/")),
+        ("admin.dept_report", 3, lambda: admin.get("/admin/report")),
+        ("admin.dept_report_csv", 2, lambda: drain(admin.get("/admin/report/export.csv"))),
+        (
+            "admin.dept_report_csv.detail",
+            3,
+            lambda: drain(admin.get("/admin/report/export.csv?detail=1")),
+        ),
+        ("admin.payroll", 5, lambda: admin.get("/admin/payroll")),
+        ("admin.payroll_csv_export", 4, lambda: drain(admin.get("/admin/payroll/export.csv"))),
+        # Entry listings spend one indexed probe on the archive table.
+        ("admin.user_report", 7, lambda: admin.get(f"/admin/user/{target}")),
+        (
+            "admin.user_report_csv",
+            4,
+            lambda: drain(admin.get(f"/admin/user/{target}/export.csv")),
+        ),
+        ("admin.backup", 4, lambda: drain(admin.get("/admin/backup"))),
+        # The job's own bookkeeping (claim, reloads, finish) runs on the job
+        # thread and is counted along with the restore itself.
+        (
+            "admin.restore",
+            lambda entries: 17 + 3 * math.ceil(entries / _RESTORE_BATCH),
+            restore,
+        ),
+    ]
+
+
+class StatementRecorder:
+    """Collects SQL from every thread, so background job work is counted.
+
+    ``paused()`` skips only the calling thread, so a job keeps being counted
+    while the request thread polls its status.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._lock = threading.Lock()
+        self._statements = None
+        self._paused = set()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            if self._statements is not None and threading.get_ident() not in self._paused:
+                self._statements.append(" ".join(statement.split()))
+
+    def start(self):
+        self._statements = []
+
+    def stop(self):
+        statements, self._statements = self._statements, None
+        return statements
+
+    @contextlib.contextmanager
+    def paused(self):
+        thread = threading.get_ident()
+        with self._lock:
+            self._paused.add(thread)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._paused.discard(thread)
+
+
+def _shorten(sql, limit=200):
+    return sql if len(sql) <= limit else sql[:limit] + " ..."
+
+
+def _report(label, size, budget, statements):
+    lines = [f"FAIL {label} at {size}: {len(statements)} statements (budget {budget})"]
+    repeated = [(sql, n) for sql, n in Counter(statements).most_common() if n > 1]
+    if repeated:
+        lines.append("  repeated statements:")
+        for sql, n in repeated:
+            lines.append(f"    {n:>5} x {_shorten(sql)}")
+    else:
+        lines.append("  no repeated statements; all statements:")
+        lines.extend(f"          {_shorten(sql)}" for sql in statements)
+    return "\n".join(lines)
+
+
+def run(sizes):
+    workdir = tempfile.mkdtemp(prefix="trackinator-budget-")
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/budget.db"
+    os.environ.setdefault("SECRET_KEY", "query-budget-secret-key-0123456789")
+
+    from app import create_app, db, jobs
+    from app.migrations import upgrade
+    from bench.datagen import generate
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    app.logger.disabled = True
+    with app.app_context():
+        recorder = StatementRecorder(db.engine)
+
+    failures = []
+    for users, entries in sizes:
+        size = f"{users}x{entries}"
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            upgrade()
+            user_ids = generate(users, entries)
+            from app.models import TimeEntry
+
+            TimeEntry.query.filter_by(user_id=user_ids[-1], clock_out=None).delete()
+            db.session.commit()
+            total_entries = TimeEntry.query.count()
+
+        from bench.run import login_client
+
+        backup_bytes = login_client(app, user_ids[0]).get("/admin/backup").data
+        # That first request started the job pool; let its startup recovery
+        # pass finish so its statements are not charged to a route.
+        jobs.runner.start().result()
+        for label, budget, request in _checks(app, recorder, user_ids, backup_bytes):
+            if callable(budget):
+                budget = budget(total_entries)
+            recorder.start()
+            response = request()
+            statements = recorder.stop()
+            if response.status_code >= 400:
+                failures.append(f"FAIL {label} at {size}: HTTP {response.status_code}")
+            elif len(statements) > budget:
+                failures.append(_report(label, size, budget, statements))
+            else:
+                print(f"ok   {label:<30} {size:>10}  {len(statements):>3} / {budget}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check per-route SQL query budgets.")
+    parser.add_argument(
+        "--sizes",
+        default="3x20,60x40",
+        help="comma-separated USERSxENTRIES_PER_USER (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    sys.path.insert(0, _ROOT)
+
+    from bench.run import parse_sizes
+
+    failures = run(parse_sizes(args.sizes))
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Route benchmarks over synthetic data at several sizes.
+
+    python -m bench.run --sizes 20x200,100x1000 --out results.json
+    python -m bench.compare before.json after.json
+
+Each scenario drives the real routes through the Flask test client against
+a throwaway SQLite database and records latency percentiles, SQL
+statements per request and peak Python memory (tracemalloc, measured on a
+separate run so it doesn't skew timings).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def login_client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    return client
+
+
+def wait_for_job(client, response, timeout=300):
+    """Follow a job redirect and block until the background job finishes."""
+    location = response.headers["Location"]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(location, query_string={"format": "json"}).json
+        if status["finished"]:
+            if status["status"] != "succeeded":
+                raise RuntimeError(f"job failed: {status['message']}")
+            return status
+        time.sleep(0.01)
+    raise RuntimeError(f"job did not finish within {timeout}s")
+
+
+def _scenarios(app, recorder, user_ids):
+    """Return ``{name: (callable, repeat_scale)}``; each callable performs one request."""
+    admin = login_client(app, user_ids[0])
+    employee = login_client(app, user_ids[len(user_ids) // 2])
+    puncher = login_client(app, user_ids[-1])
+    with app.app_context():
+        from app.models import TimeEntry
+
+        TimeEntry.query.filter_by(user_id=user_ids[-1], clock_out=None).delete()
+        from app import db
+
+        db.session.commit()
+
+    quarter_start = (date.today() - timedelta(days=90)).isoformat()
+    backup_bytes = admin.get("/admin/backup").data
+
+    def check(response, status=200):
+        if response.status_code != status:
+            raise RuntimeError(f"unexpected status {response.status_code}")
+        return response
+
+    def clock_in_out():
+        check(puncher.post("/clock-in"), 302)
+        check(puncher.post("/clock-out"), 302)
+
+    def download_backup():
+        # Drain the stream without joining it, so peak memory reflects the
+        # server side rather than the test client buffering the body.
+        response = check(admin.get("/admin/backup"))
+        for _ in response.response:
+            pass
+        response.close()
+
+    def restore():
+        response = admin.post(
+            "/admin/restore",
+            data={"backup_file": (io.BytesIO(backup_bytes), "backup.json")},
+            content_type="multipart/form-data",
+        )
+        check(response, 302)
+        # Count the job's statements, but not the status polls.
+        with recorder.paused():
+            wait_for_job(admin, response)
+
+    return {
+        "timeclock.dashboard": (lambda: check(employee.get("/")), 1.0),
+        "timeclock.clock_in_out": (clock_in_out, 1.0),
+        "admin.dashboard": (lambda: check(admin.get("/admin/")), 1.0),
+        "admin.dept_report": (lambda: check(admin.get("/admin/report")), 1.0),
+        "admin.dept_report.quarter": (
+            lambda: check(admin.get(f"/admin/report?start={quarter_start}")),
+            1.0,
+        ),
+        "admin.user_report": (
+            lambda: check(admin.get(f"/admin/user/{user_ids[len(user_ids) // 2]}")),
+            1.0,
+        ),
+        "admin.backup": (download_backup, 0.25),
+        "admin.restore": (restore, 0.25),
+    }
+
+
+def _measure(app, recorder, name, func, repeat):
+    func()  # warm-up: template compilation, caches, connection pool
+    latencies, queries = [], []
+    for _ in range(repeat):
+        recorder.start()
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(recorder.stop()))
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "n": repeat,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p90_ms": round(_percentile(latencies, 90), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries": max(queries),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(","):
+        users, _, entries = part.lower().partition("x")
+        sizes.append((int(users), int(entries)))
+    return sizes
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat, only=None, seed=1234):
+    workdir = tempfile.mkdtemp(prefix="trackinator-bench-")
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-0123456789")
+
+    from app import create_app, db
+    from app.migrations import upgrade
+    from bench.datagen import generate
+    from bench.query_budget import StatementRecorder
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    app.logger.disabled = True
+    with app.app_context():
+        recorder = StatementRecorder(db.engine)
+
+    results = []
+    for users, entries in sizes:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            upgrade()
+            user_ids = generate(users, entries, seed=seed)
+        for name, (func, scale) in _scenarios(app, recorder, user_ids).items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            result = _measure(app, recorder, name, func, max(3, int(repeat * scale)))
+            result["size"] = f"{users}x{entries}"
+            results.append(result)
+            print(
+                f"{result['size']:>12}  {name:<28} p50 {result['p50_ms']:>9.2f} ms  "
+                f"p90 {result['p90_ms']:>9.2f} ms  {result['queries']:>5} queries  "
+                f"{result['peak_kib']:>9.1f} KiB",
+                file=sys.stderr,
+            )
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Time Trackinator routes.")
+    parser.add_argument(
+        "--sizes",
+        default="10x100,50x500,200x1000",
+        help="comma-separated USERSxENTRIES_PER_USER (default: %(default)s)",
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument(
+        "--only", action="append", help="run scenarios with this name prefix (repeatable)"
+    )
+    parser.add_argument("--out", help="write JSON results to this file (default: stdout)")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out) if args.out else None
+    sys.path.insert(0, _ROOT)
+    report = run(parse_sizes(args.sizes), args.repeat, args.only, args.seed)
+    payload = json.dumps(report, indent=2)
+    if out:
+        with open(out, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Upgrade check: boot the current app against a database from the first release.
+
+    python -m bench.upgrade
+
+Builds a SQLite database with the original schema (the two tables the app
+shipped with, before any migration existed) and a few rows, including an
+overnight shift and a user with two open entries. The app is then started
+with ``AUTO_MIGRATE=1`` exactly as a worker would, and the result is
+checked: every migration applied, rollup totals match the raw entries, one
+open entry per user, and the main pages render. Exits 1 on any failure.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema as db.create_all() built it before the migrations table existed.
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL,
+    email VARCHAR(200) NOT NULL,
+    name VARCHAR(200),
+    provider VARCHAR(50),
+    is_admin BOOLEAN,
+    last_login DATETIME,
+    pay_rate FLOAT,
+    dark_mode BOOLEAN,
+    pay_period_start DATE,
+    pay_period_end DATE,
+    PRIMARY KEY (id),
+    UNIQUE (email)
+);
+CREATE TABLE time_entry (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    clock_in DATETIME NOT NULL,
+    clock_out DATETIME,
+    note VARCHAR(200),
+    created_at DATETIME,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+);
+"""
+
+
+def _stamp(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def build_baseline(path):
+    """Write a first-release database to ``path``; returns its closed-entry seconds."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    entries = [
+        (1, today - timedelta(days=3, hours=-9), today - timedelta(days=3, hours=-17)),
+        # Overnight shift, split across two days by the rollup.
+        (2, today - timedelta(days=2, hours=2), today - timedelta(days=1, hours=-6)),
+        (2, today - timedelta(hours=-8), None),
+        # A double tap from before the one-open-entry rule.
+        (2, today - timedelta(hours=-9), None),
+        (3, today - timedelta(days=1, hours=-9), today - timedelta(days=1, hours=-12)),
+    ]
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO user (id, email, name, is_admin, pay_rate, dark_mode) "
+        "VALUES (?, ?, ?, ?, ?, 0)",
+        [
+            (1, "admin@example.com", "Admin", 1, 30.0),
+            (2, "night@example.com", "Night Shift", 0, 20.0),
+            (3, "day@example.com", "Day Shift", 0, None),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO time_entry (user_id, clock_in, clock_out, note, created_at, "
+        "updated_at) VALUES (?, ?, ?, '', ?, ?)",
+        [
+            (user_id, _stamp(start), end and _stamp(end), _stamp(start), _stamp(start))
+            for user_id, start, end in entries
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return sum((end - start).total_seconds() for _, start, end in entries if end)
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="trackinator-upgrade-")
+    os.chdir(workdir)
+    path = os.path.join(workdir, "baseline.db")
+    expected_seconds = build_baseline(path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["AUTO_MIGRATE"] = "1"
+    os.environ.setdefault("SECRET_KEY", "upgrade-check-secret-key-0123456789")
+
+    from sqlalchemy import func
+
+    from app import create_app, db
+    from app.migrations import MIGRATIONS, current_version
+    from app.models import DailyHours, TimeEntry
+    from bench.run import login_client
+
+    failures = []
+    try:
+        app = create_app()
+    except Exception as exc:
+        return [f"FAIL boot: {type(exc).__name__}: {exc}"]
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    app.logger.disabled = True
+
+    with app.app_context():
+        version, latest = current_version(), MIGRATIONS[-1][0]
+        if version != latest:
+            failures.append(f"FAIL schema version {version}, expected {latest}")
+        rolled_up = db.session.scalar(db.select(func.sum(DailyHours.seconds))) or 0
+        if abs(rolled_up - expected_seconds) > 1:
+            failures.append(
+                f"FAIL rollup holds {rolled_up:.0f}s, entries hold {expected_seconds:.0f}s"
+            )
+        open_counts = db.session.execute(
+            db.select(TimeEntry.user_id, func.count())
+            .where(TimeEntry.clock_out.is_(None))
+            .group_by(TimeEntry.user_id)
+        ).all()
+        if any(n > 1 for _, n in open_counts):
+            failures.append(f"FAIL several open entries per user: {open_counts}")
+        db.session.remove()
+
+    admin, employee = login_client(app, 1), login_client(app, 2)
+    for client, url in [
+        (employee, "/"),
+        (admin, "/admin/"),
+        (admin, "/admin/report"),
+        (admin, "/admin/user/2"),
+        (admin, "/admin/payroll"),
+    ]:
+        status = client.get(url).status_code
+        if status != 200:
+            failures.append(f"FAIL GET {url}: HTTP {status}")
+        else:
+            print(f"ok   GET {url}")
+    return failures
+
+
+def main():
+    sys.path.insert(0, _ROOT)
+    failures = run()
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if not failures:
+        print("ok   upgraded from the original schema")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
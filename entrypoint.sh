@@ -3,5 +3,11 @@ set -e
 
 mkdir -p /app/instance
 
+# Apply schema changes once, before any worker starts, so the workers
+# themselves boot without touching the database.
+echo "Applying database migrations..."
+AUTO_MIGRATE=0 flask --app run migrate
+export AUTO_MIGRATE=0
+
 echo "Starting Time Trackinator..."
 exec "$@"